@@ -0,0 +1,148 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# Read cache for the CIM enumerations, GetInstance and association calls
+# made by the helpers during a test.
+#
+# The cache is off unless CIM_READ_CACHE is set or the test calls
+# enable().  Each entry remembers the classes it was built from.  Methods
+# invoked on the CIMOM drop the entries of the classes they may change.
+# Which classes those are is up to the test suite: it registers a
+# function with set_policy() that is given the method name and returns a
+# test on class names, or None when the method may change anything.
+# Without a policy every method drops the whole cache.  do_main() resets
+# the cache before each test.
+#
+# Changes made behind the CIMOM's back (virsh, ...) are the test suite's
+# to report with invalidate().  Code that polls for a change wraps the
+# check in suspend()/resume(): lookups miss while suspended, and the fresh
+# results replace the cached ones.
+
+import os
+import threading
+
+_enabled = bool(os.getenv('CIM_READ_CACHE'))
+
+# key : (set of class names, value)
+_entries = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+hits = 0
+misses = 0
+
+# method name -> test on class names or None, see set_policy()
+_policy = None
+
+def name_key(cn, keys):
+    '''Return a hashable key for the instance of class @cn with the
+    @keys keybindings.'''
+
+    keys = [(key.lower(), str(val)) for key, val in keys.items()]
+    keys.sort()
+    return (cn.lower(), tuple(keys))
+
+def set_policy(changed_by):
+    '''Use @changed_by to tell which classes a method may change.'''
+
+    global _policy
+    _policy = changed_by
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def enabled():
+    return _enabled and not getattr(_local, 'suspended', 0)
+
+def suspend():
+    '''Make lookups from this thread miss until resume().'''
+    _local.suspended = getattr(_local, 'suspended', 0) + 1
+
+def resume():
+    _local.suspended = getattr(_local, 'suspended', 0) - 1
+
+def lookup(key):
+    '''Return (True, value) if @key is cached, (False, None) if not.'''
+
+    global hits, misses
+
+    if not enabled():
+        return False, None
+
+    _lock.acquire()
+    try:
+        entry = _entries.get(key)
+        if entry is None:
+            misses += 1
+            return False, None
+
+        hits += 1
+        return True, entry[1]
+    finally:
+        _lock.release()
+
+def store(key, classes, value):
+    '''Cache @value under @key, built from the classes named in
+    @classes.'''
+
+    if not _enabled:
+        return
+
+    _lock.acquire()
+    try:
+        _entries[key] = (set([cn for cn in classes if cn]), value)
+    finally:
+        _lock.release()
+
+def invalidate(method=None):
+    '''Drop the entries @method may have changed, or all of them if
+    @method is None or not known.'''
+
+    if not _entries:
+        return
+
+    changed = None
+    if method is not None and _policy is not None:
+        changed = _policy(method.split('.')[-1])
+
+    _lock.acquire()
+    try:
+        if changed is None:
+            _entries.clear()
+            return
+
+        for key, (classes, value) in _entries.items():
+            for cn in classes:
+                if changed(cn):
+                    del _entries[key]
+                    break
+    finally:
+        _lock.release()
+
+def reset():
+    global _enabled, hits, misses
+
+    _lock.acquire()
+    try:
+        _entries.clear()
+        _enabled = bool(os.getenv('CIM_READ_CACHE'))
+        hits = 0
+        misses = 0
+    finally:
+        _lock.release()
@@ -19,6 +19,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
 #
 import pywbem
+from CimTest import Cache
 
 class _Method:
     def __init__(self, invoker, name):
@@ -41,10 +42,14 @@ class CIMMethodClass:
 
     def __invoke(self, method, params):
         try:
-            return self.conn.InvokeMethod(method, self.inst, **params)
-        except pywbem.CIMError, arg:
-            print 'InvokeMethod(%s): %s' % (method, arg[1])
-            raise
+            try:
+                return self.conn.InvokeMethod(method, self.inst, **params)
+            except pywbem.CIMError, arg:
+                print 'InvokeMethod(%s): %s' % (method, arg[1])
+                raise
+        finally:
+            # Even a failed call may have changed something
+            Cache.invalidate(method)
 
     def __getattr__(self, name):
         # magic method dispatcher
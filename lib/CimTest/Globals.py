@@ -75,7 +75,9 @@ if not CIM_IP:
     CIM_IP = "localhost"
 
 
-def log_param(log_level=logging.ERROR, file_name="cimtest.log"):
+def log_param(log_level=logging.ERROR, file_name=None):
+    if file_name is None:
+        file_name = os.getenv("CIM_LOG_FILE", "cimtest.log")
     logger.setLevel(logging.DEBUG)
     #create console handler and set level to debug
     ch = logging.StreamHandler()
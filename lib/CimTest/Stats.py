@@ -0,0 +1,228 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# Counters of the work done by a test, such as the number of CIM
+# operations and remote commands it ran.
+#
+# The helpers call count() as they go, trace() for every CIM operation
+# and trace_remote() for every remote command.  do_main() resets the
+# counters before the test runs and, when CIM_STATS_FILE is set, writes
+# them to that file once the test is done.  The runner read()s the file
+# back and adds the counters to the test's result record.
+
+import os
+import threading
+from CimTest.Globals import logger
+
+try:
+    import json
+except ImportError:
+    json = None
+
+CIM_CALLS = 'cim_calls'
+CIM_CONNECTS = 'cim_connects'
+REMOTE_CMDS = 'remote_cmds'
+CIM_OPS = 'cim_ops'
+CIM_TIME = 'cim_time'
+REMOTE_OPS = 'remote_ops'
+REMOTE_TIME = 'remote_time'
+
+_counters = {}
+_lock = threading.Lock()
+
+# (operation, class, namespace) : [calls, seconds, max seconds, errors,
+#                                  objects returned, reply bytes, last error]
+_ops = {}
+
+# (command template, host) : [calls, seconds, max seconds, failures,
+#                             output bytes, last exit code]
+_remote = {}
+
+def count(name, n=1):
+    _lock.acquire()
+    try:
+        _counters[name] = _counters.get(name, 0) + n
+    finally:
+        _lock.release()
+
+def get(name):
+    return _counters.get(name, 0)
+
+def trace(op, cn, ns, secs, objects, nbytes=None, error=None):
+    '''Account for one CIM operation @op on class @cn in namespace @ns
+    that took @secs seconds and returned @objects objects, @nbytes bytes
+    of reply if known.  @error is the CIM error code or exception name
+    if the operation failed.'''
+
+    key = (op, cn, ns)
+    _lock.acquire()
+    try:
+        rec = _ops.get(key)
+        if rec is None:
+            rec = [0, 0.0, 0.0, 0, 0, 0, None]
+            _ops[key] = rec
+
+        rec[0] += 1
+        rec[1] += secs
+        rec[2] = max(rec[2], secs)
+        rec[4] += objects
+        if nbytes is not None:
+            rec[5] += nbytes
+        if error is not None:
+            rec[3] += 1
+            rec[6] = str(error)
+    finally:
+        _lock.release()
+
+def traces():
+    '''Return the traced CIM operations, one dict per (operation, class,
+    namespace).'''
+
+    _lock.acquire()
+    try:
+        items = _ops.items()
+    finally:
+        _lock.release()
+
+    ops = []
+    for (op, cn, ns), rec in items:
+        ops.append({ 'op'         : op,
+                     'class'      : cn,
+                     'namespace'  : ns,
+                     'calls'      : rec[0],
+                     'time'       : rec[1],
+                     'max_time'   : rec[2],
+                     'errors'     : rec[3],
+                     'objects'    : rec[4],
+                     'bytes'      : rec[5],
+                     'last_error' : rec[6],
+                   })
+
+    return ops
+
+def trace_remote(template, host, secs, rc, nbytes):
+    '''Account for one command run on @host.  @template is the command
+    with its arguments left out, @rc its exit code and @nbytes the size
+    of its output.'''
+
+    key = (template, host)
+    _lock.acquire()
+    try:
+        _counters[REMOTE_CMDS] = _counters.get(REMOTE_CMDS, 0) + 1
+
+        rec = _remote.get(key)
+        if rec is None:
+            rec = [0, 0.0, 0.0, 0, 0, None]
+            _remote[key] = rec
+
+        rec[0] += 1
+        rec[1] += secs
+        rec[2] = max(rec[2], secs)
+        if rc != 0:
+            rec[3] += 1
+        rec[4] += nbytes
+        rec[5] = rc
+    finally:
+        _lock.release()
+
+def remote_traces():
+    '''Return the traced remote commands, one dict per (command template,
+    host).'''
+
+    _lock.acquire()
+    try:
+        items = _remote.items()
+    finally:
+        _lock.release()
+
+    cmds = []
+    for (template, host), rec in items:
+        cmds.append({ 'command'  : template,
+                      'host'     : host,
+                      'calls'    : rec[0],
+                      'time'     : rec[1],
+                      'max_time' : rec[2],
+                      'failures' : rec[3],
+                      'bytes'    : rec[4],
+                      'last_rc'  : rec[5],
+                    })
+
+    return cmds
+
+def reset():
+    _lock.acquire()
+    try:
+        _counters.clear()
+        _ops.clear()
+        _remote.clear()
+    finally:
+        _lock.release()
+
+def write(extra=None):
+    '''Write the counters, updated with the @extra dict, to the file
+    named by CIM_STATS_FILE.'''
+
+    stats_file = os.getenv('CIM_STATS_FILE')
+    if not stats_file or json is None:
+        return
+
+    stats = { CIM_CALLS : 0, CIM_CONNECTS : 0, REMOTE_CMDS : 0 }
+    _lock.acquire()
+    try:
+        stats.update(_counters)
+    finally:
+        _lock.release()
+    stats[CIM_OPS] = traces()
+    stats[CIM_TIME] = sum([op['time'] for op in stats[CIM_OPS]])
+    stats[REMOTE_OPS] = remote_traces()
+    stats[REMOTE_TIME] = sum([cmd['time'] for cmd in stats[REMOTE_OPS]])
+
+    if extra is not None:
+        stats.update(extra)
+
+    try:
+        f = open(stats_file, 'w')
+        try:
+            json.dump(stats, f)
+        finally:
+            f.close()
+    except IOError, details:
+        logger.error("Unable to write test stats to %s: %s", stats_file,
+                     details)
+
+def read(stats_file):
+    '''Return the counters written to @stats_file and remove the file.'''
+
+    if json is None or not os.path.exists(stats_file):
+        return {}
+
+    try:
+        f = open(stats_file)
+        try:
+            stats = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        stats = {}
+
+    try:
+        os.remove(stats_file)
+    except OSError:
+        pass
+
+    return dict([(str(key), val) for key, val in stats.items()])
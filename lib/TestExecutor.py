@@ -0,0 +1,211 @@
+#!/usr/bin/python
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+"""Persistent test executor.
+
+Instead of starting a new interpreter for every test case, the runner
+starts one long-lived worker process (this file run as a script) and
+sends it one request per test.  The worker imports each test module once
+and calls its do_main() wrapped main() directly, returning the return
+code and everything the test wrote to stdout/stderr.
+"""
+
+import os
+import sys
+import imp
+import tempfile
+import traceback
+import cPickle
+from subprocess import Popen, PIPE
+
+FAIL = 1
+
+class TestExecutor:
+    """Runner side of the executor.  The worker process is started on
+    first use and restarted if it dies while running a test.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.proc = None
+
+    def __start(self):
+        script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+        self.proc = Popen(['python', script], stdin=PIPE, stdout=PIPE,
+                          env=self.env, close_fds=True)
+
+    def run(self, t_path, test, args, env):
+        if self.proc is None:
+            self.__start()
+
+        req = { 'path' : os.path.abspath(t_path),
+                'test' : test,
+                'args' : args,
+                'env'  : env,
+              }
+
+        try:
+            cPickle.dump(req, self.proc.stdin, 2)
+            self.proc.stdin.flush()
+            reply = cPickle.load(self.proc.stdout)
+        except (EOFError, IOError, cPickle.UnpicklingError):
+            rc = self.stop()
+            return FAIL, "Test executor exited with status %s while " \
+                         "running %s" % (rc, test)
+
+        return reply['rc'], reply['output']
+
+    def stop(self):
+        if self.proc is None:
+            return None
+
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+
+        rc = self.proc.wait()
+        self.proc = None
+        return rc
+
+def _reset_log():
+    from CimTest import Globals
+
+    for h in Globals.logger.handlers[:]:
+        Globals.logger.removeHandler(h)
+        h.close()
+
+def _load_test(modules, path, test):
+    name = os.path.join(path, test)
+    if name not in modules:
+        mod_name = "cimtest_%s_%s" % (os.path.basename(path),
+                                      os.path.splitext(test)[0])
+        modules[name] = imp.load_source(mod_name, name)
+
+    return modules[name]
+
+def _reset_state():
+    """Clear the module level state the helpers keep between calls."""
+
+    from CimTest import Stats, Cache
+
+    Stats.reset()
+    Cache.reset()
+
+    host_facts = sys.modules.get('XenKvmLib.host_facts')
+    if host_facts is not None:
+        host_facts.reset()
+
+    state_wait = sys.modules.get('XenKvmLib.state_wait')
+    if state_wait is not None:
+        del state_wait.wait_stats[:]
+
+def _restore_env(saved):
+    for key in os.environ.keys():
+        if key not in saved:
+            del os.environ[key]
+
+    for key, val in saved.items():
+        if os.environ.get(key) != val:
+            os.environ[key] = val
+
+def _run_one(modules, req):
+    from CimTest import Globals
+
+    # Tests may change the settings in Globals and the environment, put
+    # them back once the test is done so the next test starts clean.
+    saved_globals = dict([(key, val) for key, val in vars(Globals).items()
+                          if key.startswith('CIM_')])
+    saved_env = dict(os.environ)
+
+    os.chdir(req['path'])
+    sys.path[0] = req['path']
+    sys.argv = [req['test']] + req['args']
+    os.environ.update(req['env'])
+    Globals.CIM_TC = req['env'].get('CIM_TC', " ")
+    _reset_log()
+    _reset_state()
+
+    try:
+        try:
+            mod = _load_test(modules, req['path'], req['test'])
+            rc = mod.main()
+        except SystemExit, details:
+            rc = details.code
+        except Exception:
+            traceback.print_exc()
+            rc = FAIL
+    finally:
+        for key, val in saved_globals.items():
+            setattr(Globals, key, val)
+        _restore_env(saved_env)
+
+    if not isinstance(rc, int):
+        rc = FAIL
+
+    return rc
+
+def serve():
+    # Keep private copies of the pipes to the runner so that nothing a
+    # test prints can end up in the protocol stream.  fds 1 and 2 are
+    # pointed at a capture file while each test is running.
+    req_in = os.fdopen(os.dup(0), 'rb')
+    reply_out = os.fdopen(os.dup(1), 'wb')
+    null = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null, 0)
+    os.dup2(null, 1)
+    os.close(null)
+
+    saved_out = os.dup(1)
+    saved_err = os.dup(2)
+    modules = {}
+
+    while True:
+        try:
+            req = cPickle.load(req_in)
+        except EOFError:
+            break
+
+        capture = tempfile.TemporaryFile()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(capture.fileno(), 1)
+        os.dup2(capture.fileno(), 2)
+
+        try:
+            rc = _run_one(modules, req)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_out, 1)
+            os.dup2(saved_err, 2)
+
+        capture.seek(0)
+        output = capture.read()
+        capture.close()
+        if output[-1:] == '\n':
+            output = output[:-1]
+
+        cPickle.dump({ 'rc' : rc, 'output' : output }, reply_out, 2)
+        reply_out.flush()
+
+    _reset_log()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(serve())
@@ -29,8 +29,91 @@ DEFAULT_LOG_FILE = "run_report.txt"
 import Reporter
 import re 
 import os
+from xml.sax.saxutils import escape, quoteattr
 from CimTest.ReturnCodes import PASS, FAIL, XFAIL, SKIP
 
+try:
+    import json
+except ImportError:
+    json = None
+
+STATUS_NAMES = { PASS  : "PASS",
+                 FAIL  : "FAIL",
+                 SKIP  : "SKIP",
+                 XFAIL : "XFAIL"
+               }
+
+def merge_results(results_files, log_file=DEFAULT_LOG_FILE, expected=None):
+    """Combine the JSON Lines result files of several runs, for example
+    the shards of a run split across hosts, into log_file and its result
+    files.  The (group, test) pairs found more than once, and those of
+    the expected list that were not found, are reported in the log and
+    kept in the duplicated and missing lists of the TestSuite.  Return
+    the TestSuite, already finished, or None if a result file can't be
+    read."""
+    statuses = dict([(name, status)
+                     for status, name in STATUS_NAMES.items()])
+
+    # Read everything first, log_file's own result file may be one of them
+    records = []
+    for results_file in results_files:
+        recs = read_results(results_file)
+        if recs is None:
+            return None
+        records.extend(recs)
+
+    found = {}
+    for rec in records:
+        key = (rec["group"], rec["test"])
+        found[key] = found.get(key, 0) + 1
+
+    suite = TestSuite(log=True, file_name=log_file)
+    suite.duplicated = [key for key, count in found.items() if count > 1]
+    suite.duplicated.sort()
+    suite.missing = []
+    if expected is not None:
+        suite.missing = [key for key in expected if key not in found]
+
+    for rec in records:
+        stats = dict([(str(key), val) for key, val in rec.items()
+                      if key not in ("group", "test", "status", "bug",
+                                     "time")])
+        suite.print_results(rec["group"], rec["test"],
+                            statuses[rec["status"]],
+                            "Bug:<%s>" % rec["bug"] if rec["bug"] else "",
+                            rec["time"], stats)
+
+    for group, test in suite.duplicated:
+        suite.debug("Ran more than once: %s - %s" % (group, test))
+    for group, test in suite.missing:
+        suite.debug("Did not run: %s - %s" % (group, test))
+
+    suite.finish()
+    return suite
+
+def results_files(log_file):
+    """Return the names of the JSON Lines and JUnit XML result files that
+    go with log_file."""
+    base = os.path.splitext(log_file)[0]
+    return base + ".jsonl", base + ".xml"
+
+def read_results(results_file):
+    """Return the records written to a JSON Lines result file, or None if
+    it can't be read."""
+    if json is None or not os.path.exists(results_file):
+        return None
+
+    records = []
+    fd = open(results_file, "r")
+    try:
+        for line in fd.xreadlines():
+            if line.strip():
+                records.append(json.loads(line))
+    finally:
+        fd.close()
+
+    return records
+
 class TestSuite:
     """Test Suite class to make the output of driving test suites a bit more consistant"""
 
@@ -48,9 +131,21 @@ class TestSuite:
             self.log_file = None
             self.log_fd = None
 
+        # One record per test, written as JSON Lines as the run goes and as
+        # JUnit XML by finish()
+        self.records = []
+        self.results_fd = None
+        self.results_file = None
+        self.junit_file = None
+        if self.log_file is not None:
+            self.results_file, self.junit_file = results_files(self.log_file)
+            if json is not None:
+                self.results_fd = open(self.results_file, "w")
+
         self.rep = Reporter.Reporter(verbosity=5, log_fd=self.log_fd)
 
-    def print_results(self, group, test, status, output=""):
+    def print_results(self, group, test, status, output="", exec_time=None,
+                      stats=None):
         bug = None
         if status == XFAIL:
             err = "Test error: returned XFAIL without a valid bug string."
@@ -71,6 +166,67 @@ class TestSuite:
         if output and status != PASS:
             self.rep.debug(1, output)
 
+        self.record(group, test, status, bug, output, exec_time, stats)
+
+    def record(self, group, test, status, bug, output, exec_time, stats):
+        rec = { "group"       : group,
+                "test"        : test,
+                "status"      : STATUS_NAMES[status],
+                "bug"         : bug,
+                "time"        : exec_time,
+                "cim_calls"   : None,
+                "cim_connects": None,
+                "remote_cmds" : None,
+                "cim_time"    : None,
+                "remote_time" : None,
+                "waits"       : None,
+                "wait_time"   : None,
+              }
+        if stats:
+            rec.update(stats)
+
+        if self.results_fd is not None:
+            self.results_fd.write(json.dumps(rec) + "\n")
+            self.results_fd.flush()
+
+        # The output is only kept for the JUnit report
+        self.records.append((rec, output))
+
+    def write_junit(self):
+        def clean(text):
+            # Control characters are not allowed in XML documents
+            return re.sub("[\x00-\x08\x0b\x0c\x0e-\x1f]", "", text)
+
+        counts = { "PASS" : 0, "FAIL" : 0, "SKIP" : 0, "XFAIL" : 0 }
+        total_time = 0
+        cases = ""
+        for rec, output in self.records:
+            counts[rec["status"]] += 1
+            total_time += rec["time"] or 0
+
+            cases += '  <testcase classname=%s name=%s time="%.3f">\n' % \
+                     (quoteattr(rec["group"]), quoteattr(rec["test"]),
+                      rec["time"] or 0)
+            if rec["status"] == "FAIL":
+                cases += '    <failure message="FAIL">%s</failure>\n' % \
+                         escape(clean(output))
+            elif rec["status"] == "XFAIL":
+                cases += '    <skipped message=%s/>\n' % \
+                         quoteattr("XFAIL Bug: %s" % rec["bug"])
+            elif rec["status"] == "SKIP":
+                cases += '    <skipped/>\n'
+            cases += '  </testcase>\n'
+
+        fd = open(self.junit_file, "w")
+        fd.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        fd.write('<testsuite name="cimtest" tests="%d" failures="%d" '
+                 'skipped="%d" time="%.3f">\n' % 
+                 (len(self.records), counts["FAIL"],
+                  counts["SKIP"] + counts["XFAIL"], total_time))
+        fd.write(cases)
+        fd.write('</testsuite>\n')
+        fd.close()
+
     def debug(self, str):
             self.rep.debug(1, str)
  
@@ -78,6 +234,13 @@ class TestSuite:
         if self.log_fd is not None:
             self.log_fd.close()
 
+        if self.results_fd is not None:
+            self.results_fd.close()
+            self.results_fd = None
+
+        if self.junit_file is not None:
+            self.write_junit()
+
 class RPCTestSuite:
     """Test Suite class to make the output of driving test suites a bit more consistant
 
@@ -23,7 +23,9 @@
 """
 
 import os
+import re
 import glob
+import heapq
 
 # Group utils
 
@@ -147,3 +149,92 @@ def get_subset_test_list(test_suite, test_subset):
 
     return ret
 
+
+def expected_time(test_list, durations):
+    """Return the expected run time of each test in test_list, a list in
+       the same order.  durations maps (group, test) to seconds; tests it
+       doesn't know are expected to take the median of the ones it does.
+    """
+    known = [durations[(t['group'], t['test'])] for t in test_list
+             if (t['group'], t['test']) in durations]
+    known.sort()
+    if known:
+        default = known[len(known) / 2]
+    else:
+        default = 1.0
+
+    return [durations.get((t['group'], t['test']), default)
+            for t in test_list]
+
+def shard_tests(test_list, shard, shards, durations):
+    """Split test_list into shards balanced by expected run time and
+       return shard number shard (counting from 1) of them.  The tests
+       are handed out longest first, each to the shard with the least
+       work so far.  The shard keeps the tests in their original order.
+    """
+    times = expected_time(test_list, durations)
+
+    order = range(len(test_list))
+    order.sort(key=lambda i: times[i], reverse=True)
+
+    loads = [(0.0, i) for i in range(shards)]
+    assigned = [[] for i in range(shards)]
+    for i in order:
+        load, bin = heapq.heappop(loads)
+        assigned[bin].append(i)
+        heapq.heappush(loads, (load + times[i], bin))
+
+    mine = assigned[shard - 1]
+    mine.sort()
+    return [test_list[i] for i in mine]
+
+def sort_by_duration(test_list, durations):
+    """Return test_list with the tests expected to take longest first,
+       so that concurrent workers don't end on a long test.
+    """
+    times = expected_time(test_list, durations)
+
+    order = range(len(test_list))
+    order.sort(key=lambda i: times[i], reverse=True)
+    return [test_list[i] for i in order]
+
+# Resource of the tests that hardcode no name we know of.  Such a test
+# may touch anything, so it never runs alongside another test.
+EXCLUSIVE = '*'
+
+# Groups whose tests always run alone.  The CIMOM delivers the
+# indications of every guest to every subscription, so an indication test
+# can pass on another test's guest; migrations act on the whole host.
+EXCLUSIVE_GROUPS = ['Indication', 'Migration']
+
+def get_test_resources(test_suite, test):
+    """Return the set of guest, pool and network names a test hardcodes.
+       Tests sharing any of these names must not run at the same time.
+       A test without any, that can't be read or that belongs to one of
+       the EXCLUSIVE_GROUPS gets EXCLUSIVE.
+    """
+    for word in EXCLUSIVE_GROUPS:
+        if word in test['group']:
+            return set([EXCLUSIVE])
+
+    res_re = re.compile(r"""^\s*\w*(dom|guest|vm|pool|net|vol)\w*\s*=\s*"""
+                        r"""['"]([^'"]+)['"]""", re.IGNORECASE)
+    ret = set()
+
+    path = os.path.join(test_suite, test['group'], test['test'])
+    try:
+        f = open(path, 'r')
+        for line in f.readlines():
+            m = res_re.match(line)
+            # Format strings such as 'NetworkPool/%s' are no names
+            if m and '%' not in m.group(2):
+                ret.add(m.group(2))
+        f.close()
+    except IOError:
+        pass
+
+    if not ret:
+        ret.add(EXCLUSIVE)
+
+    return ret
+
@@ -58,9 +58,11 @@
 #                                                           Date : 05.02.2008
 
 import sys
+from pywbem.cim_obj import CIMInstanceName
 from XenKvmLib.vxml import get_class
 from XenKvmLib.classes import get_typed_class
-from XenKvmLib.assoc import Associators, AssociatorNames, compare_all_prop
+from XenKvmLib.assoc import Associators, AssociatorNames, compare_all_prop, \
+                            walk
 from CimTest.Globals import logger, CIM_ERROR_ASSOCIATORS
 from XenKvmLib.const import do_main
 from CimTest.ReturnCodes import PASS, FAIL
@@ -192,17 +194,25 @@ def get_sds_info(server, virt, cs_cn, rasd_values,
     try:
 
         an = get_typed_class(virt,"SettingsDefineState")
+        devs = []
         for cn, devid in in_setting_define_state:
-            assoc_info = Associators(server, an, cn, DeviceID = devid,
-                                     CreationClassName = cn,
-                                     SystemName = test_dom,
-                                     SystemCreationClassName = cs_cn)
+            devs.append(CIMInstanceName(cn, keybindings = {
+                                        'DeviceID' : devid,
+                                        'CreationClassName' : cn,
+                                        'SystemName' : test_dom,
+                                        'SystemCreationClassName' : cs_cn }))
+
+        # Resolve the association for all the devices at once
+        sds = walk(server, devs, [(an, None)])
+        for dev in devs:
+            assoc_info = sds.targets(1, dev)
 
             # we expect only one RASD record to be returned for each device 
             # type when queried with SDS association.
             if len(assoc_info) != 1:
                 raise Exception("get_sds_info %s returned %d %s objects, "
-                                "Expected 1" % (an, len(assoc_info), cn))
+                                "Expected 1" % (an, len(assoc_info),
+                                                dev.classname))
 
             assoc_val = assoc_info[0]
             CCName = assoc_val.classname
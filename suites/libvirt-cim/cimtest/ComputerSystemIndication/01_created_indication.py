@@ -21,49 +21,16 @@
 # 
 
 import sys
-from os import waitpid, kill, fork, _exit, WNOHANG
-from signal import SIGKILL
-from time import sleep
 from CimTest.Globals import logger
 from XenKvmLib.const import do_main
 from CimTest.ReturnCodes import PASS, FAIL
-from XenKvmLib.classes import get_typed_class
-from XenKvmLib.indication_tester import CIMIndicationSubscription
-from XenKvmLib.vxml import set_default
+from XenKvmLib.indications import sub_ind, wait_for_ind, unsub_ind
 from XenKvmLib.vxml import get_class
 
 SUPPORTED_TYPES = ['Xen', 'XenFV', 'KVM']
 
 test_dom = "domU"
 
-def sub_ind(ip, virt):
-    dict = set_default(ip)
-    ind_names = {"define" : 'ComputerSystemCreatedIndication', 
-                 "start" : 'ComputerSystemModifiedIndication',
-                 "destroy" : 'ComputerSystemDeletedIndication'
-                }
-
-    sub_list = {}
-    port = 5
-
-    for ind, iname in ind_names.iteritems():
-        ind_name = get_typed_class(virt, iname)
-
-        sub_name = "Test%s" % ind_name
-        port += 1
-
-        sub = CIMIndicationSubscription(sub_name, ind_name,
-                                        dict['default_ns'],
-                                        dict['default_print_ind'],
-                                        dict['default_sysname'],
-                                        port)
-        sub.subscribe(dict['default_url'], dict['default_auth'])
-        logger.info("Watching for %s", iname)
-        ind_names[ind] = ind_name
-        sub_list[ind] = sub
-
-    return sub_list, ind_names, dict
-
 def gen_ind(test_dom, ip, vtype, ind, cxml):
     if ind == "define":
         ret = cxml.cim_define(ip)
@@ -85,57 +52,6 @@ def gen_ind(test_dom, ip, vtype, ind, cxml):
         
     return FAIL 
 
-def handle_request(sub, ind_name, dict, exp_ind_ct):
-    #sfcb delivers indications to all registrations, even if the indication
-    #isn't what the registration was subscribed to.  So, for modified and 
-    #deleted indications, we must loop through until the indication we are
-    #looking for is triggered.
-    for i in range(0, exp_ind_ct):
-        sub.server.handle_request() 
-        if len(sub.server.indications) < 1:
-            logger.error("No valid indications received")
-            return FAIL
-
-        if str(sub.server.indications[0]) == ind_name:
-                sub.unsubscribe(dict['default_auth'])
-                logger.info("Cancelling subscription for %s", ind_name)
-                return PASS
-        else:
-                sub.server.indications.remove(sub.server.indications[0])
-
-    logger.error("Did not recieve indication %s", ind_name)
-    return FAIL
-
-def poll_for_ind(pid, ind_name):
-    status = FAIL
-    for i in range(0, 20):
-        pw = waitpid(pid, WNOHANG)
-
-        # If pid exits, waitpid returns [pid, return_code] 
-        # If pid is still running, waitpid returns [0, 0]
-        # Only return a success if waitpid returns the expected pid
-        # and the return code is 0.
-        if pw[0] == pid and pw[1] == 0:
-            logger.info("Great, got %s indication successfuly", ind_name)
-            status = PASS
-            break
-        elif pw[1] == 0 and i < 19:
-            if i % 10 == 0:
-                logger.info("In child, waiting for %s indication", ind_name)
-            sleep(1)
-        else:
-            # Time is up and waitpid never returned the expected pid
-            if pw[0] != pid:
-                logger.error("Waited too long for %s indication", ind_name)
-                kill(pid, SIGKILL)
-            else:
-                logger.error("Received indication error: %d", pw[1])
-
-            status = FAIL
-            break
-
-    return status
-
 @do_main(SUPPORTED_TYPES)
 def main():
     options = main.options
@@ -143,7 +59,12 @@ def main():
     virt = options.virt
     status = FAIL
 
-    sub_list, ind_names, dict = sub_ind(ip, virt)
+    ind_names = {"define" : 'ComputerSystemCreatedIndication', 
+                 "start" : 'ComputerSystemModifiedIndication',
+                 "destroy" : 'ComputerSystemDeletedIndication'
+                }
+
+    sub_list, ind_names, dict = sub_ind(ip, virt, ind_names)
 
     ind_list = ["define", "start", "destroy"]
 
@@ -154,36 +75,19 @@ def main():
         ind_name = ind_names[ind]
 
         try:
-            pid = fork()
-            if pid == 0:
-                status = handle_request(sub, ind_name, dict, len(ind_list))
-                if status != PASS:
-                    _exit(1)
-
-                _exit(0)
-            else:
-                try:
-                    status = gen_ind(test_dom, ip, virt, ind, cxml)
-                    if status != PASS:
-                        kill(pid, SIGKILL)
-                        raise Exception("Unable to generate indication") 
-
-                    status = poll_for_ind(pid, ind)
-                    if status != PASS:
-                        raise Exception("Poll for indication Failed")
-
-                except Exception, details:
-                    kill(pid, SIGKILL)
-                    raise Exception(details)
+            status = gen_ind(test_dom, ip, virt, ind, cxml)
+            if status != PASS:
+                raise Exception("Unable to generate indication") 
+
+            status = wait_for_ind(sub, ind_name)
+            if status != PASS:
+                raise Exception("Wait for indication Failed")
 
         except Exception, details:
             logger.error("Exception: %s", details)
             status = FAIL
 
-    #Make sure all subscriptions are really unsubscribed
-    for ind, sub in sub_list.iteritems():
-        sub.unsubscribe(dict['default_auth'])
-        logger.info("Cancelling subscription for %s", ind_names[ind])
+    unsub_ind(sub_list, ind_names, dict)
        
     cxml.undefine(ip)
 
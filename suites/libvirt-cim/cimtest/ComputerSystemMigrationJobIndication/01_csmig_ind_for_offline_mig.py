@@ -28,9 +28,7 @@
 #
 
 import sys
-from signal import SIGKILL
 from socket import gethostname
-from os import kill, fork, _exit
 from XenKvmLib.vxml import get_class
 from XenKvmLib.xm_virt_util import domain_list, net_list
 from CimTest.Globals import logger
@@ -39,7 +37,7 @@ from CimTest.ReturnCodes import PASS, FAIL
 from XenKvmLib.vsmigrations import check_mig_support, local_remote_migrate
 from XenKvmLib.common_util import poll_for_state_change, create_netpool_conf,\
                                   destroy_netpool
-from XenKvmLib.indications import sub_ind, handle_request, poll_for_ind
+from XenKvmLib.indications import sub_ind, wait_for_ind, unsub_ind
 
 sup_types = ['KVM', 'Xen', 'XenFV']
 
@@ -149,29 +147,14 @@ def main():
         ind_name = ind_names[ind]
         logger.info("\n Verifying '%s' indications ....", ind_name)
         try:
-            pid = fork()
-            if pid == 0:
-                status = handle_request(sub, ind_name, dict, 
-                                        len(ind_names.keys()))
-                if status != PASS:
-                    _exit(1)
-
-                _exit(0)
-            else:
-                try:
-                    status, cxml = gen_indication(test_dom, s_sysname, 
-                                                  virt, t_sysname)
-                    if status != PASS:
-                        kill(pid, SIGKILL)
-                        raise Exception("Unable to generate indication") 
-
-                    status = poll_for_ind(pid, ind_name)
-                    if status != PASS:
-                        raise Exception("Poll for indication Failed")
-
-                except Exception, details:
-                    kill(pid, SIGKILL)
-                    raise Exception(details)
+            status, cxml = gen_indication(test_dom, s_sysname, virt,
+                                          t_sysname)
+            if status != PASS:
+                raise Exception("Unable to generate indication") 
+
+            status = wait_for_ind(sub, ind_name)
+            if status != PASS:
+                raise Exception("Wait for indication Failed")
 
         except Exception, details:
             logger.error("Exception: %s", details)
@@ -184,10 +167,7 @@ def main():
                               s_sysname, clean_net=False)
 
 
-    #Make sure all subscriptions are really unsubscribed
-    for ind, sub in sub_list.iteritems():
-        sub.unsubscribe(dict['default_auth'])
-        logger.info("Cancelling subscription for %s", ind_names[ind])
+    unsub_ind(sub_list, ind_names, dict)
 
     cleanup_guest_netpool(virt, cxml, test_dom, t_sysname, 
                           s_sysname)
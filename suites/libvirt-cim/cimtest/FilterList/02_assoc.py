@@ -83,70 +83,26 @@ def main():
                          n_vir_rules, n_cim_rules)
             return FAIL
 
+        diff = helper.diff_filter(_vir_f, instances)
 
-        # TODO: Create a new class to handle the filter parsing
-        def parse_filter(element, spaces=""):
-            logger.info("%s%s(%s)%s",
-                        spaces,
-                        element.tag,
-                        element.attrib and element.attrib or "",
-                        element.text and ": %s" % element.text or "")
-
-            # Recurse to last element in tree
-            for e in element:
-                parse_filter(e, "%s  " % spaces)
-
-            if element.tag == "filterref":
-                name = element.get("filter")
-                try:
-                    i = [inst for inst in instances if inst["Name"] == name][0]
-                    logger.info("%s* MATCH: Instance: %s", spaces, i)
-                    instances.remove(i)
-                    return
-                except:
-                    raise Exception("No CIM Instance matching this rule was found")
-            elif element.tag == "rule":
-                if not instances:
-                    raise Exception("No CIM Instance matching this rule was found")
-
-                rule = helper.FilterRule(element)
-
-                # Find matching instance
-                logger.info("%s* %s", spaces, rule)
-                for i in instances:
-                    props = ""
-                    for p in i.properties.keys():
-                        props = "%s '%s':'%s'" % (props, p, i[p])
-                    logger.info("%s* %s(%s)", spaces, i.classname, props)
-
-                    matches, msg = rule.matches(i)
-                    if msg:
-                        logger.info("%s* %s: %s", spaces, matches and "MATCH" or "DON'T MATCH", msg)
-
-                    if matches:
-                        instances.remove(i)
-                        return
-
-                # No matching instance
-                raise Exception("No CIM instance matching rule found")
-            else:
-                # Unexpected tag, ignore by now
-                pass
-        # parse_filter
+        for rule, i in diff.matched:
+            logger.info("* MATCH: %s: %s", rule, i.classname)
 
-        try:
-            parse_filter(_vir_f)
-        except Exception, e:
-            logger.error("Error parsing filter '%s': %s", _vir_f.tag, e)
-            return FAIL
+        for rule, i, msg in diff.mismatched:
+            logger.error("Rule %s does not match instance %s: %s", rule,
+                         i.classname, msg)
 
-        # Check for leftovers
-        for i in instances:
+        for rule in diff.missing:
+            logger.error("No CIM instance matching %s was found", rule)
+
+        for i in diff.extra:
             props = ""
             for p in i.properties.keys():
                 props = "%s '%s':'%s'" % (props, p, i[p])
 
             logger.error("Could NOT find match for instance %s : {%s}", i.classname, props)
+
+        if not diff.ok():
             return FAIL
     # end for inst_name in cim_filters
 
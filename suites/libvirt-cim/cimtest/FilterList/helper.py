@@ -31,6 +31,7 @@ import XenKvmLib
 from XenKvmLib.xm_virt_util import virt2uri
 from XenKvmLib.classes import get_typed_class
 from XenKvmLib.vxml import get_class
+from XenKvmLib.cim_conn import get_conn
 
 import VirtLib
 from VirtLib.utils import run_remote
@@ -47,9 +48,8 @@ class BaseTestObject(object):
         self.user = CimTest.Globals.CIM_USER
         self.passwd = CimTest.Globals.CIM_PASS
         self.namespace = CimTest.Globals.CIM_NS
-        self.wbem = pywbem.WBEMConnection("http://%s" % server,
-                                          (self.user, self.passwd),
-                                          self.namespace)
+        self.wbem = get_conn(server, self.namespace,
+                             (self.user, self.passwd))
         self.wbem.debug = True
     # __init__
 
@@ -185,8 +185,15 @@ class FilterListTest(BaseTestObject):
 
     def __init__(self, server, virt):
         BaseTestObject.__init__(self, server, virt)
+        self.__filter_xml = None
     # __init__
 
+    def CreateFilterListInstance(self, name, class_name=None, props={}):
+        self.__filter_xml = None
+        return BaseTestObject.CreateFilterListInstance(self, name,
+                                                       class_name, props)
+    # CreateFilterListInstance
+
     def libvirt_filter_lists(self):
         cmd = "virsh -q -c %s nwfilter-list 2>/dev/null" % self.uri
         ret, filters = run_remote(self.server, cmd)
@@ -246,17 +253,57 @@ class FilterListTest(BaseTestObject):
         return etree.fromstring(_xml)
     # libvirt_filter_dumpxml
 
+    def libvirt_filter_xml(self):
+        """Return the XML of every filter, fetched with a single remote
+        command, as a dict indexed by both filter name and UUID.  The
+        dict is kept until a filter list is created through this object.
+        """
+        if self.__filter_xml is not None:
+            return self.__filter_xml
+
+        cmd = "for f in $(virsh -q -c %s nwfilter-list 2>/dev/null | " \
+              "awk \"{print \\$1}\"); do " \
+              "virsh -q -c %s nwfilter-dumpxml $f 2>/dev/null || exit 1; " \
+              "done" % (self.uri, self.uri)
+        ret, out = run_remote(self.server, cmd)
+        if ret:
+            logger.error("Error dumping the filters")
+            return None
+
+        # Remove all unecessary spaces and new lines
+        _xml = "".join([a.strip() for a in out.split("\n") if a])
+        try:
+            root = etree.fromstring("<filters>%s</filters>" % _xml)
+        except etree.XMLSyntaxError, details:
+            logger.error("Unable to parse the filters: %s", details)
+            return None
+
+        d = {}
+        for f in root:
+            d[f.get("name")] = f
+            d[f.findtext("uuid")] = f
+
+        self.__filter_xml = d
+        return d
+    # libvirt_filter_xml
+
     def libvirt_entries_in_filter_lists(self):
         filters = self.libvirt_filter_lists()
+        if filters is None:
+            return None
+
+        _xml = self.libvirt_filter_xml()
+        if _xml is None:
+            return None
 
         d = {}
         for f in filters:
-            root = self.libvirt_filter_dumpxml(f[0])
-            if root is None:
+            try:
+                d[f] = _xml[f[0]]
+            except KeyError:
+                logger.error("No XML dumped for filter %s", f[1])
                 return None
 
-            d[f] = root
-
         return d
     # libvirt_entries_in_filter_lists
 
@@ -537,5 +584,244 @@ class FilterRule(object):
 
         return (True, "Found matching CIM Instance: %s" % instance)
     # matches
+
+    def __kind(self, key, val):
+        if val.startswith("0x"):
+            return "hex"
+        elif "mask" in key:
+            return "mask"
+        elif "addr" in key:
+            return "addr"
+        return "str"
+    # __kind
+
+    def signature_keys(self):
+        """Return the (property, kind) pairs of the CIM properties this
+        rule is compared on, kind telling how to normalize the values."""
+        if not self.rulemap:
+            return ()
+
+        keys = {}
+        if self.version:
+            keys[self.rulemap["version"]] = "str"
+
+        for key in self.__dict:
+            inst_key = self.rulemap.get(key)
+            val = self.__getattr__(key)
+            if not inst_key or val is None:
+                continue
+
+            # Addresses starting with '$' are variables that match anything
+            if "addr" in key and val.startswith("$"):
+                continue
+
+            keys[inst_key] = self.__kind(key, val)
+
+        keys = keys.items()
+        keys.sort()
+        return tuple(keys)
+    # signature_keys
+
+    def signature(self):
+        """Return the normalized values of the rule, in the order of
+        signature_keys()."""
+        by_prop = {}
+        if self.version:
+            by_prop[self.rulemap["version"]] = self.version
+
+        for key in self.__dict:
+            inst_key = self.rulemap.get(key)
+            if inst_key:
+                by_prop[inst_key] = self.__getattr__(key)
+
+        sig = []
+        for inst_key, kind in self.signature_keys():
+            val = by_prop[inst_key]
+            try:
+                if kind == "hex":
+                    val = long(val, 16)
+                elif kind == "mask" and "." not in val and ":" not in val:
+                    val = tuple(self.__cidr_to_list(val))
+                elif kind in ("mask", "addr"):
+                    val = addr_signature(val)
+            except ValueError:
+                # Compared as is, it then only matches the same string
+                pass
+            sig.append(val)
+
+        return tuple(sig)
+    # signature
 # FilterRule
 
+
+def addr_signature(val):
+    if ":" in val:
+        return tuple([long(v, 16) for v in val.split(":")])
+    return tuple([long(v, 10) for v in val.split(".")])
+# addr_signature
+
+
+def instance_value(instance, inst_key, kind):
+    """Return the normalized value of the property inst_key of a CIM
+    filter entry, raising KeyError if the entry doesn't have it."""
+    prop = instance.properties[inst_key]
+
+    val = prop.value
+    if val is None:
+        return None
+
+    try:
+        if kind == "hex":
+            return long(val)
+        elif kind in ("mask", "addr"):
+            if prop.is_array:
+                return tuple([long(v) for v in val])
+            return addr_signature(str(val))
+    except ValueError:
+        pass
+
+    return str(val)
+# instance_value
+
+
+def instance_signature(instance, keys):
+    """Return the normalized values of the properties of a CIM filter
+    entry named by keys, the signature_keys() of a FilterRule."""
+    try:
+        return tuple([instance_value(instance, inst_key, kind)
+                      for inst_key, kind in keys])
+    except KeyError:
+        return None
+# instance_signature
+
+
+def signature_diff(rule, instance):
+    """Return a message listing the properties on which the CIM filter
+    entry instance differs from rule."""
+    diffs = []
+    for (inst_key, kind), val in zip(rule.signature_keys(), rule.signature()):
+        try:
+            inst_val = instance_value(instance, inst_key, kind)
+        except KeyError:
+            diffs.append("'%s' missing, expected '%s'" % (inst_key, val))
+            continue
+
+        if inst_val != val:
+            diffs.append("'%s' is '%s', expected '%s'" % (inst_key, inst_val,
+                                                          val))
+
+    return ", ".join(diffs)
+# signature_diff
+
+
+class FilterDiff(object):
+    """Result of diff_filter(): the rules and filter references of a
+    libvirt filter that have a CIM instance matching them, the ones
+    missing from CIM, the CIM instances left over, and the rules that
+    only partly match a leftover instance, with the reason why."""
+
+    def __init__(self):
+        self.matched = []
+        self.missing = []
+        self.extra = []
+        self.mismatched = []
+    # __init__
+
+    def ok(self):
+        return not (self.missing or self.extra or self.mismatched)
+    # ok
+# FilterDiff
+
+
+def diff_filter(element, instances):
+    """Compare the rules and filter references of the libvirt filter
+    element with the CIM instances associated to the filter list.
+
+    Both sides are reduced to signatures once and matched through dicts,
+    so a filter is compared in time linear in its number of rules.
+    """
+    diff = FilterDiff()
+    left = list(instances)
+
+    # Filter references match nested filter lists by name
+    lists = {}
+    for i, inst in enumerate(left):
+        if "FilterList" in inst.classname:
+            lists.setdefault(inst["Name"], []).append(i)
+
+    rules = {}
+    used = set()
+    for e in element:
+        if e.tag == "filterref":
+            found = lists.get(e.get("filter"))
+            if found:
+                i = found.pop()
+                used.add(i)
+                diff.matched.append((e, left[i]))
+            else:
+                diff.missing.append(e)
+        elif e.tag == "rule":
+            rule = FilterRule(e)
+            rules.setdefault((rule.basename, rule.signature_keys()),
+                             []).append(rule)
+
+    # Rules sharing the same properties to compare share one index of the
+    # CIM instances
+    for (basename, keys), group in rules.items():
+        if not basename:
+            diff.missing.extend(group)
+            continue
+
+        index = {}
+        for i, inst in enumerate(left):
+            if i not in used and basename in inst.classname:
+                sig = instance_signature(inst, keys)
+                if sig is not None:
+                    index.setdefault(sig, []).append(i)
+
+        for rule in group:
+            found = index.get(rule.signature())
+            if found:
+                i = found.pop(0)
+                used.add(i)
+                diff.matched.append((rule, left[i]))
+            else:
+                diff.missing.append(rule)
+
+    # Pair what is left by class, direction, action and priority, to tell
+    # what differs instead of reporting the rule and instance separately
+    base = {}
+    for i, inst in enumerate(left):
+        if i in used or "FilterList" in inst.classname:
+            continue
+
+        props = inst.properties
+        key = tuple([inst.classname.split("_", 1)[-1]] +
+                    [name in props and props[name].value is not None and
+                     str(props[name].value) or None
+                     for name in ("Direction", "Action", "Priority")])
+        base.setdefault(key, []).append(i)
+
+    missing = diff.missing
+    diff.missing = []
+    for rule in missing:
+        found = None
+        if isinstance(rule, FilterRule):
+            try:
+                found = base.get((rule.basename, rule.direction, rule.action,
+                                  rule.priority))
+            except KeyError:
+                pass
+
+        if found:
+            i = found.pop()
+            used.add(i)
+            diff.mismatched.append((rule, left[i],
+                                    signature_diff(rule, left[i])))
+        else:
+            diff.missing.append(rule)
+
+    diff.extra = [inst for i, inst in enumerate(left) if i not in used]
+    return diff
+# diff_filter
+
@@ -103,8 +103,9 @@ def main():
         vsxml.undefine(server)
         return status
 
-    if len(vsxml.res_settings) != len(rasds):
-        logger.error("Expected %d RASDs, got %d", len(vsxml.res_settings),
+    res_settings = vsxml.res_settings + vsxml.rasd_settings(options.ip)
+    if len(res_settings) != len(rasds):
+        logger.error("Expected %d RASDs, got %d", len(res_settings),
                      len(rasds))
         vsxml.undefine(server)
         return FAIL
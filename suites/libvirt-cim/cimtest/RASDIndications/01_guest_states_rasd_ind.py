@@ -28,9 +28,7 @@
 #
 
 import sys
-from signal import SIGKILL
 from socket import gethostname
-from os import kill, fork, _exit
 from XenKvmLib.vxml import get_class
 from XenKvmLib.xm_virt_util import active_domain_list
 from CimTest.Globals import logger
@@ -38,7 +36,7 @@ from XenKvmLib.const import do_main, CIM_ENABLE, CIM_DISABLE, \
 	                    get_provider_version
 from CimTest.ReturnCodes import PASS, FAIL, SKIP
 from XenKvmLib.common_util import poll_for_state_change 
-from XenKvmLib.indications import sub_ind, handle_request, poll_for_ind
+from XenKvmLib.indications import sub_ind, wait_for_ind, unsub_ind
 
 sup_types = ['KVM', 'Xen', 'XenFV']
 libvirt_guest_rasd_indication_rev = 980
@@ -120,27 +118,14 @@ def main():
         logger.info("\n Verifying '%s' indications ....", ind_name)
         
         try:
-            pid = fork()
-            if pid == 0:
-                status = handle_request(sub, ind_name, dict, 
-                                        len(ind_names.keys()))
-                if status != PASS:
-                    _exit(1)
-                _exit(0)
-            else:
-                try:
-                    status, cxml = gen_indication(test_dom, s_sysname, 
-                                                  virt, cxml, ind)
-                    if status != PASS:
-                        raise Exception("Unable to generate indication") 
-
-                    status = poll_for_ind(pid, ind_name)
-                    if status != PASS:
-                        raise Exception("Poll for indication Failed")
-
-                except Exception, details:
-                    kill(pid, SIGKILL)
-                    raise Exception(details)
+            status, cxml = gen_indication(test_dom, s_sysname, virt, cxml,
+                                          ind)
+            if status != PASS:
+                raise Exception("Unable to generate indication") 
+
+            status = wait_for_ind(sub, ind_name)
+            if status != PASS:
+                raise Exception("Wait for indication Failed")
 
         except Exception, details:
             logger.error("Exception: %s", details)
@@ -149,10 +134,7 @@ def main():
         if status != PASS:
             break
         
-    #Make sure all subscriptions are really unsubscribed
-    for ind, sub in sub_list.iteritems():
-        sub.unsubscribe(dict['default_auth'])
-        logger.info("Cancelling subscription for %s", ind_names[ind])
+    unsub_ind(sub_list, ind_names, dict)
 
     active_doms = active_domain_list(s_sysname, virt)
     if test_dom in active_doms:
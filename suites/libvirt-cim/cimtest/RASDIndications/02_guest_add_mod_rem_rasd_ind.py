@@ -28,19 +28,17 @@
 #
 
 import sys
-from signal import SIGKILL
 from XenKvmLib import vsms
 from XenKvmLib import vsms_util
 from XenKvmLib.classes import get_typed_class
 from XenKvmLib.enumclass import EnumNames
 from socket import gethostname
-from os import kill, fork, _exit
 from XenKvmLib.vxml import get_class
 from CimTest.Globals import logger
 from XenKvmLib.const import do_main, CIM_DISABLE, get_provider_version
 from CimTest.ReturnCodes import PASS, FAIL, SKIP
 from XenKvmLib.common_util import poll_for_state_change 
-from XenKvmLib.indications import sub_ind, handle_request, poll_for_ind
+from XenKvmLib.indications import sub_ind, wait_for_ind, unsub_ind
 
 sup_types = ['KVM', 'Xen', 'XenFV']
 libvirt_guest_rasd_indication_rev = 980
@@ -177,36 +175,20 @@ def main():
         logger.info("\n Verifying '%s' indications ....", ind_name)
         
         try:
-            pid = fork()
-            if pid == 0:
-                status = handle_request(sub, ind_name, dict, 
-                                        len(ind_names.keys()))
-                if status != PASS:
-                    _exit(1)
-
-                _exit(0)
+            if ind != 'delete':
+                rasd = rasd_info[ind][0]
+                val  = rasd_info[ind][1]
+                status = gen_indication(test_dom, s_sysname, virt, cxml,
+                                        service, ind, rasd, val)
             else:
-                try:
-                    if ind != 'delete':
-                        rasd = rasd_info[ind][0]
-                        val  = rasd_info[ind][1]
-                        status = gen_indication(test_dom, s_sysname, 
-                                                      virt, cxml, service,
-                                                      ind, rasd, val)
-                    else:
-                        status = gen_indication(test_dom, s_sysname, 
-                                                      virt, cxml, service,
-                                                      ind)
-                    if status != PASS:
-                        raise Exception("Unable to generate indication") 
-       
-                    status = poll_for_ind(pid, ind_name)
-                    if status != PASS:
-                        raise Exception("Poll for indication Failed")
+                status = gen_indication(test_dom, s_sysname, virt, cxml,
+                                        service, ind)
+            if status != PASS:
+                raise Exception("Unable to generate indication") 
 
-                except Exception, details:
-                    kill(pid, SIGKILL)
-                    raise Exception(details)
+            status = wait_for_ind(sub, ind_name)
+            if status != PASS:
+                raise Exception("Wait for indication Failed")
 
         except Exception, details:
             logger.error("Exception: %s", details)
@@ -215,10 +197,7 @@ def main():
         if status != PASS:
             break
         
-	    #Make sure all subscriptions are really unsubscribed
-    for ind, sub in sub_list.iteritems():
-        sub.unsubscribe(dict['default_auth'])
-        logger.info("Cancelling subscription for %s", ind_names[ind])
+    unsub_ind(sub_list, ind_names, dict)
 
     ret = cxml.undefine(s_sysname)
     if not ret:
@@ -22,13 +22,14 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
 #
-from CimTest import Globals
+from CimTest import Globals, Cache
 from VirtLib import utils
 import pywbem
 from pywbem.cim_obj import CIMInstanceName
 from XenKvmLib.classes import get_typed_class, get_class_type
 from CimTest.ReturnCodes import PASS, FAIL
 from CimTest.Globals import logger
+from XenKvmLib.cim_conn import get_conn, run_concurrent, pool_size
 
 def AssociatorNames(host, assoc_cn, classname, **keys):
     '''Resolve the association specified by @type, given the
@@ -41,19 +42,27 @@ def AssociatorNames(host, assoc_cn, classname, **keys):
         prev_namespace = Globals.CIM_NS
         Globals.CIM_NS = 'root/cimv2'
 
-    conn = myWBEMConnection('http://%s' % host,
-                            (Globals.CIM_USER, Globals.CIM_PASS),
-                            Globals.CIM_NS)
-    instanceref = CIMInstanceName(classname, keybindings=keys)
-    
-    names = []
+    key = ('AssociatorNames', host, Globals.CIM_NS, assoc_cn,
+           Cache.name_key(classname, keys))
+    found, names = Cache.lookup(key)
+    if found:
+        names = [name.copy() for name in names]
+    else:
+        conn = get_conn(host, conn_class=myWBEMConnection)
+        instanceref = CIMInstanceName(classname, keybindings=keys)
+
+        names = []
+
+        try:
+            names = conn.AssociatorNames(instanceref, AssocClass=assoc_cn)
+        except pywbem.CIMError, arg:
+            print arg[1]
+            return names
+
+        Cache.store(key, [classname, assoc_cn] +
+                    [name.classname for name in names],
+                    [name.copy() for name in names])
 
-    try:
-        names = conn.AssociatorNames(instanceref, AssocClass=assoc_cn)
-    except pywbem.CIMError, arg:
-        print arg[1]
-        return names
-    
     if (get_class_type(classname) == "Linux"):
         Globals.CIM_NS = prev_namespace
 
@@ -70,17 +79,24 @@ def Associators(host, assoc_cn, classname, **keys):
         prev_namespace = Globals.CIM_NS
         Globals.CIM_NS = 'root/cimv2'
 
-    conn = myWBEMConnection('http://%s' % host,
-                            (Globals.CIM_USER, Globals.CIM_PASS),
-                            Globals.CIM_NS)
-    instanceref = CIMInstanceName(classname, keybindings=keys)
-    
-    names = []
+    key = ('Associators', host, Globals.CIM_NS, assoc_cn,
+           Cache.name_key(classname, keys))
+    found, names = Cache.lookup(key)
+    if found:
+        names = [inst.copy() for inst in names]
+    else:
+        conn = get_conn(host, conn_class=myWBEMConnection)
+        instanceref = CIMInstanceName(classname, keybindings=keys)
+
+        names = []
 
-    try:
-        names = conn.Associators(instanceref, AssocClass=assoc_cn)
-    except pywbem.CIMError, arg:
-        print arg[1]
+        try:
+            names = conn.Associators(instanceref, AssocClass=assoc_cn)
+            Cache.store(key, [classname, assoc_cn] +
+                        [inst.classname for inst in names],
+                        [inst.copy() for inst in names])
+        except pywbem.CIMError, arg:
+            print arg[1]
 
     if (get_class_type(classname) == "Linux"):
         Globals.CIM_NS = prev_namespace
@@ -120,6 +136,100 @@ class myWBEMConnection(pywbem.WBEMConnection):
         else:
             return map(lambda x: x[2], result[2])
  
+def ref_key(ref):
+    '''Return a hashable key identifying the instance name @ref, whatever
+    its host and namespace.'''
+
+    keys = [(key.lower(), str(val)) for key, val in ref.keybindings.items()]
+    keys.sort()
+    return (ref.classname.lower(), tuple(keys))
+
+class AssocWalk:
+    '''Result of walk().
+
+    self.levels[0] holds the start instance names and self.levels[i] the
+    objects reached by hop i, each of them once.  self.edges[i] maps the
+    ref_key() of each object of level i to the objects its association
+    returned, in the order the CIMOM returned them.  self.errors holds
+    (hop, instance name, exception) for the calls that failed.'''
+
+    def __init__(self, start):
+        self.levels = [start]
+        self.edges = []
+        self.errors = []
+
+    def reached(self, hop):
+        '''Return the objects reached by hop @hop, counting from 1.'''
+        return self.levels[hop]
+
+    def targets(self, hop, obj):
+        '''Return the objects hop @hop reached from @obj, an object of
+        level @hop - 1.'''
+        return self.edges[hop - 1].get(ref_key(_obj_ref(obj)), [])
+
+def _obj_ref(obj):
+    if isinstance(obj, CIMInstanceName):
+        return obj
+    return obj.path
+
+def walk(host, start, path, names=False, ns=None, jobs=pool_size):
+    '''Follow @path, a list of (AssocClass, ResultClass) hops either of
+    which may be None, from the instances or instance names in @start.
+
+    Each hop resolves the associations of all the objects reached by the
+    previous hop concurrently, from at most @jobs threads, and each
+    object reached by a hop is followed only once.  Associators is used
+    unless @names is set, in which case the walk is done with
+    AssociatorNames.  Return an AssocWalk.'''
+
+    conn = get_conn(host, ns, conn_class=myWBEMConnection)
+
+    frontier = []
+    seen = set()
+    for obj in start:
+        key = ref_key(_obj_ref(obj))
+        if key not in seen:
+            seen.add(key)
+            frontier.append(obj)
+
+    result = AssocWalk(frontier)
+
+    for hop, (assoc_cn, result_cn) in enumerate(path):
+        params = {}
+        if assoc_cn is not None:
+            params['AssocClass'] = assoc_cn
+        if result_cn is not None:
+            params['ResultClass'] = result_cn
+
+        def follow(obj):
+            if names:
+                return conn.AssociatorNames(_obj_ref(obj), **params)
+            return conn.Associators(_obj_ref(obj), **params)
+
+        edges = {}
+        reached = []
+        seen = set()
+        for obj, (objs, error) in zip(frontier,
+                                      run_concurrent(follow, frontier, jobs)):
+            if error is not None:
+                logger.error("%s from %s failed: %s", assoc_cn,
+                             _obj_ref(obj), error)
+                result.errors.append((hop + 1, _obj_ref(obj), error))
+                objs = []
+
+            edges[ref_key(_obj_ref(obj))] = objs
+            for target in objs:
+                key = ref_key(_obj_ref(target))
+                if key not in seen:
+                    seen.add(key)
+                    reached.append(target)
+
+        result.edges.append(edges)
+        result.levels.append(reached)
+        frontier = reached
+
+    return result
+
 def filter_by_result_class(result_list, result_class):
     new_list = []
     if result_list == None or len(result_list) < 1:
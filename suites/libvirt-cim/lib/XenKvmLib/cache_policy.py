@@ -0,0 +1,96 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+
+# Which libvirt-cim classes the CIM methods may change, for the
+# CimTest.Cache read cache.
+#
+# Pool methods change the pool related classes, the other guest methods
+# (DefineSystem, RequestStateChange, ...) everything but the host level
+# classes.  Any other method may change anything.  The policy is
+# registered with the cache when this module is imported.
+
+from CimTest import Cache
+
+# Classes whose instances and associations no guest or pool method changes
+STATIC_CLASSES = set(['HostSystem',
+                      'RegisteredProfile',
+                      'VirtualSystemManagementService',
+                      'VirtualSystemManagementCapabilities',
+                      'ResourcePoolConfigurationService',
+                      'ResourcePoolConfigurationCapabilities',
+                      'VirtualSystemMigrationService',
+                      'VirtualSystemMigrationCapabilities',
+                      'VirtualSystemMigrationSettingData',
+                      'VirtualSystemSnapshotService',
+                      'VirtualSystemSnapshotServiceCapabilities',
+                      'ConsoleRedirectionService',
+                      'ConsoleRedirectionServiceCapabilities',
+                      'HostedService',
+                     ])
+
+POOL_METHODS = set(['CreateChildResourcePool',
+                    'DeleteResourcePool',
+                    'CreateResourceInPool',
+                    'DeleteResourceInPool',
+                    'AddResourcesToResourcePool',
+                    'RemoveResourcesFromResourcePool',
+                    'ChangeParentResourcePool',
+                   ])
+
+# Class basenames containing any of these are changed by pool methods
+POOL_WORDS = ['Pool', 'AllocationCapabilities', 'SettingsDefineCapabilities',
+              'ResourceAllocationSettingData', 'ElementCapabilities']
+
+GUEST_METHODS = set(['DefineSystem',
+                     'DestroySystem',
+                     'ModifySystemSettings',
+                     'AddResourceSettings',
+                     'ModifyResourceSettings',
+                     'RemoveResourceSettings',
+                     'RequestStateChange',
+                     'CreateSnapshot',
+                     'DestroySnapshot',
+                     'ApplySnapshot',
+                     'MigrateVirtualSystemToHost',
+                     'MigrateVirtualSystemToSystem',
+                    ])
+
+def basename(cn):
+    '''Return the class name @cn without its Xen_, KVM_, ... prefix.'''
+    return cn.split('_', 1)[-1]
+
+def changed_by(method):
+    '''Return a test telling whether @method may change a class, or None
+    if it may change any class.'''
+
+    if method in POOL_METHODS:
+        def changed(cn):
+            cn = basename(cn)
+            for word in POOL_WORDS:
+                if word in cn:
+                    return True
+            return False
+        return changed
+
+    if method in GUEST_METHODS:
+        return lambda cn: basename(cn) not in STATIC_CLASSES
+
+    return None
+
+Cache.set_policy(changed_by)
@@ -0,0 +1,402 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# Traced WBEM connections over persistent HTTP connections, shared by
+# the cimtest helpers.
+#
+# get_conn() returns a proxy that behaves like a pywbem.WBEMConnection.
+# Each thread using the proxy runs its operations on a connection object
+# of its own, so attributes such as last_raw_reply describe the last
+# operation of the calling thread.
+#
+# pywbem opens a new HTTP connection for every request.  Requests made
+# through the proxies are sent over a pool of keep-alive connections
+# instead, one pool per (host, port, credentials).  CIM_POOL_SIZE bounds
+# the number of connections, and so of concurrent requests, per pool.  A
+# connection idle for more than CIM_POOL_IDLE seconds, or whose socket
+# has been closed by the CIMOM, is not reused; a request failing on a
+# reused connection is sent again once over a new one.
+#
+# Every operation is traced: its class, namespace, latency, result size
+# and error are added to the per-test summary kept by CimTest.Stats.
+#
+# run_concurrent() spreads independent operations over CIM_POOL_SIZE
+# threads.
+#
+# Methods and instance changes run through the proxy invalidate the
+# CimTest.Cache read cache, following the policy of cache_policy.
+
+import os
+import sys
+import base64
+import select
+import socket
+import urllib
+import httplib
+import threading
+from time import time
+from Queue import Queue, Empty
+import pywbem
+from pywbem import cim_http
+from CimTest import Globals, Stats, Cache
+from XenKvmLib import cache_policy
+
+pool_size = int(os.getenv('CIM_POOL_SIZE', '4'))
+pool_idle = int(os.getenv('CIM_POOL_IDLE', '60'))
+
+DEFAULT_PORT = 5988
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+# Pool the requests of the current thread go through, set while a proxy
+# runs an operation
+_current = threading.local()
+
+class HTTPPool:
+    '''Bounded pool of keep-alive HTTP connections to one CIMOM.'''
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def __alive(self, conn):
+        # An idle keep-alive socket becomes readable only when the CIMOM
+        # closed it (or sent something we didn't ask for)
+        if conn.sock is None:
+            return False
+        try:
+            readable = select.select([conn.sock], [], [], 0)[0]
+        except (select.error, socket.error):
+            return False
+        return not readable
+
+    def __get(self):
+        self.lock.acquire()
+        try:
+            while self.idle:
+                conn, last_used = self.idle.pop()
+                if time() - last_used < pool_idle and self.__alive(conn):
+                    return conn, True
+                conn.close()
+        finally:
+            self.lock.release()
+
+        Stats.count(Stats.CIM_CONNECTS)
+        return httplib.HTTPConnection(self.host, self.port), False
+
+    def __put(self, conn):
+        self.lock.acquire()
+        self.idle.append((conn, time()))
+        self.lock.release()
+
+    def __post(self, conn, data, creds, headers):
+        conn.putrequest('POST', '/cimom')
+        conn.putheader('Content-type', 'application/xml; charset="utf-8"')
+        conn.putheader('Content-length', len(data))
+        if creds is not None:
+            auth = base64.encodestring('%s:%s' % (creds[0], creds[1]))
+            conn.putheader('Authorization',
+                           'Basic %s' % auth.replace('\n', ''))
+        for hdr in headers:
+            name, val = [x.strip() for x in hdr.split(':', 1)]
+            conn.putheader(urllib.quote(name), urllib.quote(val))
+        conn.endheaders()
+        conn.send(data)
+
+        response = conn.getresponse()
+        body = response.read()
+        return response, body
+
+    def request(self, data, creds, headers):
+        '''Send a CIM-XML request and return the body of the reply.
+        Errors are raised as pywbem's cim_http errors.'''
+
+        self.slots.acquire()
+        try:
+            conn, reused = self.__get()
+            try:
+                try:
+                    response, body = self.__post(conn, data, creds, headers)
+                except (socket.error, httplib.HTTPException):
+                    conn.close()
+                    if not reused:
+                        raise
+
+                    # The CIMOM dropped the connection since it was last
+                    # used, try again on a fresh one
+                    conn, reused = httplib.HTTPConnection(self.host,
+                                                          self.port), False
+                    Stats.count(Stats.CIM_CONNECTS)
+                    response, body = self.__post(conn, data, creds, headers)
+            except httplib.BadStatusLine, details:
+                conn.close()
+                raise cim_http.Error("The web server returned a bad status "
+                                     "line: '%s'" % details)
+            except (socket.error, httplib.HTTPException), details:
+                conn.close()
+                raise cim_http.Error("Socket error: %s" % (details,))
+
+            if response.will_close:
+                conn.close()
+            else:
+                self.__put(conn)
+        finally:
+            self.slots.release()
+
+        if response.status != 200:
+            if response.status == 401:
+                raise cim_http.AuthError(response.reason)
+            if response.getheader('CIMError', None) is not None and \
+               response.getheader('PGErrorDetail', None) is not None:
+                raise cim_http.Error("CIMError: %s: %s" %
+                                     (response.getheader('CIMError'),
+                                      urllib.unquote(
+                                        response.getheader('PGErrorDetail'))))
+            raise cim_http.Error("HTTP error %d: %s" %
+                                 (response.status, response.reason))
+
+        return body
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            for conn, last_used in self.idle:
+                conn.close()
+            self.idle = []
+        finally:
+            self.lock.release()
+
+def get_pool(host, port=DEFAULT_PORT, creds=None):
+    '''Return the HTTPPool for requests to the CIMOM on @host and @port
+    made with @creds.'''
+
+    global _pools_pid
+
+    _pools_lock.acquire()
+    try:
+        # Sockets must not be shared with a forked child
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        key = (host, port, creds)
+        if key not in _pools:
+            _pools[key] = HTTPPool(host, port)
+        return _pools[key]
+    finally:
+        _pools_lock.release()
+
+_wbem_request = cim_http.wbem_request
+
+def wbem_request(url, data, creds, headers=[], debug=0, x509=None,
+                 *args, **kwargs):
+    '''Replacement for pywbem's cim_http.wbem_request that sends the
+    requests of a proxy operation through its HTTPPool.  Everything
+    else goes to pywbem's own implementation.'''
+
+    pool = getattr(_current, 'pool', None)
+    if pool is None or x509 is not None or not url.startswith('http://'):
+        return _wbem_request(url, data, creds, headers, debug, x509,
+                             *args, **kwargs)
+
+    return pool.request(data, creds, headers)
+
+cim_http.wbem_request = wbem_request
+
+# Some pywbem versions import wbem_request into cim_operations
+_ops_module = sys.modules[pywbem.WBEMConnection.__module__]
+if getattr(_ops_module, 'wbem_request', None) is _wbem_request:
+    _ops_module.wbem_request = wbem_request
+
+def _op_class(name, args, kwargs):
+    '''Return the name of the class a CIM operation works on.'''
+
+    if name == 'InvokeMethod':
+        if len(args) > 1:
+            obj = args[1]
+        else:
+            obj = kwargs.get('ObjectName')
+    elif args:
+        obj = args[0]
+    else:
+        obj = None
+        for key in ['ClassName', 'InstanceName', 'ObjectName', 'NewInstance',
+                    'ModifiedInstance']:
+            if key in kwargs:
+                obj = kwargs[key]
+                break
+
+    if isinstance(obj, basestring):
+        return obj
+
+    return getattr(obj, 'classname', None)
+
+def _result_size(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+class TracedConnection:
+    '''Stand-in for a pywbem.WBEMConnection that traces each operation.
+    Attributes that are not methods, such as last_raw_reply, are read
+    from the connection that ran the calling thread's most recent
+    operation.  Setting debug turns on pywbem's debug mode for the
+    operations run through this proxy.'''
+
+    debug = False
+
+    def __init__(self, pool, creds, ns, conn_class):
+        self.pool = pool
+        self.url = 'http://%s:%d' % (pool.host, pool.port)
+        self.creds = creds
+        self.default_namespace = ns
+        self.conn_class = conn_class
+        self.local = threading.local()
+
+    def __conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.conn_class(self.url, self.creds,
+                                   self.default_namespace)
+            self.local.conn = conn
+        return conn
+
+    def __call_traced(self, name, *args, **kwargs):
+        Stats.count(Stats.CIM_CALLS)
+        conn = self.__conn()
+        conn.debug = self.debug
+        result = None
+        error = None
+        prev_pool = getattr(_current, 'pool', None)
+        _current.pool = self.pool
+        start_time = time()
+        try:
+            try:
+                result = getattr(conn, name)(*args, **kwargs)
+                return result
+            except pywbem.CIMError, arg:
+                error = arg[0]
+                raise
+            except:
+                error = sys.exc_info()[0].__name__
+                raise
+        finally:
+            _current.pool = prev_pool
+
+            nbytes = None
+            reply = getattr(conn, 'last_raw_reply', None)
+            if self.debug and reply is not None:
+                nbytes = len(reply)
+            Stats.trace(name, _op_class(name, args, kwargs),
+                        kwargs.get('namespace') or self.default_namespace,
+                        time() - start_time, _result_size(result), nbytes,
+                        error)
+
+            if name == 'InvokeMethod':
+                Cache.invalidate(args and args[0] or kwargs.get('MethodName'))
+            elif name in ('CreateInstance', 'ModifyInstance',
+                          'DeleteInstance'):
+                Cache.invalidate()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        if callable(getattr(self.conn_class, name, None)):
+            def method(*args, **kwargs):
+                return self.__call_traced(name, *args, **kwargs)
+            return method
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            raise AttributeError(name)
+
+        return getattr(conn, name)
+
+def get_conn(host, ns=None, creds=None, conn_class=pywbem.WBEMConnection):
+    '''Return a traced connection to the CIMOM on @host, given as host
+    or host:port.  The namespace and credentials default to CIM_NS,
+    CIM_USER and CIM_PASS.'''
+
+    if ns is None:
+        ns = Globals.CIM_NS
+    if creds is None:
+        creds = (Globals.CIM_USER, Globals.CIM_PASS)
+
+    port = DEFAULT_PORT
+    if ':' in host:
+        host, port = host.rsplit(':', 1)
+        port = int(port)
+
+    return TracedConnection(get_pool(host, port, creds), creds, ns,
+                            conn_class)
+
+def run_concurrent(func, items, jobs=pool_size):
+    '''Call @func on each of @items from at most @jobs threads.  Return a
+    list of (result, exception) in the order of @items, exception being
+    None when the call succeeded.'''
+
+    results = [None] * len(items)
+    todo = Queue()
+    for i in range(0, len(items)):
+        todo.put(i)
+
+    def worker():
+        while True:
+            try:
+                i = todo.get_nowait()
+            except Empty:
+                return
+
+            try:
+                results[i] = (func(items[i]), None)
+            except Exception, details:
+                results[i] = (None, details)
+
+    if jobs <= 1 or len(items) <= 1:
+        worker()
+        return results
+
+    threads = []
+    for i in range(0, min(jobs, len(items))):
+        t = threading.Thread(target=worker)
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    return results
+
+def close_all():
+    '''Close all idle pooled connections.'''
+
+    _pools_lock.acquire()
+    try:
+        for pool in _pools.values():
+            pool.clear()
+    finally:
+        _pools_lock.release()
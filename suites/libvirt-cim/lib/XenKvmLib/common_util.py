@@ -42,6 +42,7 @@ from XenKvmLib.xm_virt_util import diskpool_list, virsh_version,\
                                    virsh_version_cmp, net_list,\
                                    domain_list, virt2uri, net_destroy
 from XenKvmLib.vxml import PoolXML, NetXML
+from XenKvmLib.state_wait import wait_for
 from VirtLib import utils 
 from XenKvmLib.const import default_pool_name, default_network_name,\
                             default_bridge_name
@@ -126,19 +127,20 @@ def poll_for_state_change(server, virt, dom, exp_state, timeout=30):
             'CreationClassName' : cs_class
            }
 
-    try:
-        for i in range(1, (timeout + 1)):
-            dom_cs = enumclass.GetInstance(server, cs_class, keys)
-            if dom_cs is None or dom_cs.Name != dom:
-                continue
+    cs_list = [None]
+    def check():
+        cs_list[0] = enumclass.GetInstance(server, cs_class, keys)
+        return cs_list[0] is not None and cs_list[0].Name == dom and \
+               cs_list[0].EnabledState == exp_state
 
-            sleep(1)
-            if dom_cs.EnabledState == exp_state:
-                break
+    try:
+        wait_for(check, timeout, server, virt2uri(virt), dom,
+                 "%s to reach state %s" % (dom, exp_state))
+        dom_cs = cs_list[0]
 
     except Exception, detail:
         logger.error("Exception: %s", detail)
-        return FAIL, dom_cs
+        return FAIL, cs_list[0]
 
     if dom_cs is None or dom_cs.Name != dom:
         logger.error("CS instance not returned for %s.", dom)
@@ -449,12 +451,13 @@ def libvirt_cached_data_poll(ip, virt, dom_name):
     if dom_name in dom_list:
         timeout = 10 
 
-        for i in range(0, timeout):
-            rc, cs = get_cs_instance(dom_name, ip, virt)
-            if rc == 0:
-                return cs 
+        cs_list = [None]
+        def check():
+            rc, cs_list[0] = get_cs_instance(dom_name, ip, virt)
+            return rc == 0
 
-            sleep(1)
+        wait_for(check, timeout, desc="%s to appear in the CIMOM" % dom_name)
+        cs = cs_list[0]
             
     return cs
 
@@ -24,7 +24,8 @@ import traceback
 from optparse import OptionParser
 from VirtLib.utils import run_remote 
 from CimTest.Globals import CIM_IP
-from pywbem import WBEMConnection
+from XenKvmLib.cim_conn import get_conn
+from XenKvmLib.host_facts import host_fact
 from XenKvmLib.classes import get_typed_class
 
 platform_sup = ["Xen", "KVM", "XenFV"]
@@ -65,8 +66,23 @@ default_net_type = 'network'
 #vxml.PoolXML
 default_pool_name = 'cimtest-diskpool'
 
+# Per-worker guest namespace, exported by main.py when running with --jobs.
+# Worker 0 is the serial runner and keeps the historical defaults.
+worker_id = int(os.getenv('CIM_WORKER_ID', '0'))
+dom_prefix = os.getenv('CIM_DOM_PREFIX', '')
+ind_port_offset = int(os.getenv('CIM_IND_PORT_OFFSET', '0'))
+
+def worker_mac(mac):
+    # Give each worker its own MAC range by replacing the fifth octet
+    if worker_id == 0:
+        return mac
+
+    octets = mac.split(':')
+    octets[4] = '%02x' % (worker_id % 256)
+    return ':'.join(octets)
+
 # vxml.VirtXML
-default_domname = 'domU1'
+default_domname = dom_prefix + 'domU1'
 default_memory = 128
 default_vcpus = 1
 default_mallocunits="MegaBytes"
@@ -80,7 +96,7 @@ Xen_init_path = os.path.join(_image_dir, 'default-xen-initrd')
 Xen_disk_path = os.path.join(_image_dir, 'default-xen-dimage')
 Xen_secondary_disk_path = os.path.join(_image_dir, 'default-xen-dimage.2ND')
 Xen_default_disk_dev = 'xvda'
-Xen_default_mac = '88:22:33:aa:bb:cc'
+Xen_default_mac = worker_mac('88:22:33:aa:bb:cc')
 
 # vxml.KVMXML
 KVM_default_emulator = '/usr/bin/qemu-system-x86_64'
@@ -88,7 +104,7 @@ KVM_disk_path = os.path.join(_image_dir, 'default-kvm-dimage')
 KVM_secondary_disk_path = os.path.join(_image_dir, 'default-kvm-dimage.2ND')
 KVM_default_disk_dev = 'vda'
 KVM_default_cdrom_dev = 'hdc'
-KVM_default_mac = '88:22:33:aa:bb:cc'
+KVM_default_mac = worker_mac('88:22:33:aa:bb:cc')
 
 # vxml.XenFVXML
 s, o = platform.architecture()
@@ -101,7 +117,7 @@ XenFV_default_emulator = '/usr/%s/xen/bin/qemu-dm' % arch
 XenFV_disk_path = os.path.join(_image_dir, 'default-kvm-dimage')
 XenFV_secondary_disk_path = os.path.join(_image_dir, 'default-kvm-dimage.2ND')
 XenFV_default_disk_dev = 'hda'
-XenFV_default_mac = '00:16:3e:5d:c7:9e'
+XenFV_default_mac = worker_mac('00:16:3e:5d:c7:9e')
 
 #vxml.LXCXML
 LXC_init_path = os.path.join(_image_dir, 'cimtest_lxc_init')
@@ -109,7 +125,7 @@ LXC_default_emulator = '/usr/libexec/libvirt_lxc'
 LXC_default_tty = '/dev/ptmx'
 LXC_default_mp = '/tmp'
 LXC_default_source = '/var/lib/libvirt/images/lxc_files'
-LXC_default_mac = '88:22:33:aa:bb:cc'
+LXC_default_mac = worker_mac('88:22:33:aa:bb:cc')
 LXC_netns_support = False  
 
 parser = OptionParser()
@@ -133,6 +149,11 @@ def do_main(types=['Xen'], p=parser):
             return lambda:SKIP
         else:
             def do_try():
+                from CimTest import Stats, Cache
+                from XenKvmLib.state_wait import wait_stats
+                Stats.reset()
+                Cache.reset()
+                del wait_stats[:]
                 try:
                     from CimTest.Globals import logger, log_param 
                     log_param()
@@ -143,16 +164,19 @@ def do_main(types=['Xen'], p=parser):
                     logger.error('%s : %s', e.__class__.__name__, e)
                     logger.error("%s", traceback.print_exc())
                     rc = FAIL
+                Stats.write({'waits' : len(wait_stats),
+                             'wait_time' : sum([w[1] for w in wait_stats]),
+                             'cache_hits' : Cache.hits,
+                             'cache_misses' : Cache.misses})
                 return rc
             setattr(do_try, 'options', options)
             return do_try
     return do_type
 
 
+@host_fact('ip', 'virt', skip=(None, (0, "Unknown")))
 def get_provider_version(virt, ip):
-    conn = WBEMConnection('http://%s' % ip,
-                          (os.getenv('CIM_USER'), os.getenv('CIM_PASS')),
-                          os.getenv('CIM_NS'))
+    conn = get_conn(ip)
     vsms_cn = get_typed_class(virt, 'VirtualSystemManagementService')
     try:
         inst = conn.EnumerateInstances(vsms_cn)
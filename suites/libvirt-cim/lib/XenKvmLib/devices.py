@@ -29,7 +29,7 @@ from CimTest.Globals import logger
 from XenKvmLib import assoc
 from XenKvmLib.classes import get_typed_class
 from XenKvmLib.const import get_provider_version
-from XenKvmLib.enumclass import EnumInstances
+from XenKvmLib.enumclass import EnumInstances, EnumInstancesMany, enum_jobs
 
 graphics_dev_rev = 725
 input_dev_rev = 745
@@ -105,7 +105,7 @@ def dev_cn_to_rasd_cn(dev_cn, virt):
     else:
         return None
 
-def enum_dev(virt, ip):
+def enum_dev(virt, ip, jobs=enum_jobs):
     dev_list = ['Processor', 'Memory', 'NetworkPort', 'LogicalDisk']
 
     curr_cim_rev, changeset = get_provider_version(virt, ip)
@@ -121,10 +121,8 @@ def enum_dev(virt, ip):
     dev_insts = {}
 
     try:
-        for dev in dev_list:
-            dev_cn = get_typed_class(virt, dev)
-            list = EnumInstances(ip, dev_cn)
-
+        dev_cns = [get_typed_class(virt, dev) for dev in dev_list]
+        for list in EnumInstancesMany(ip, dev_cns, jobs):
             if len(list) < 1:
                 continue
 
@@ -23,12 +23,22 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
 #
+import os
 import pywbem
 from pywbem.cim_obj import CIMInstanceName
 from XenKvmLib.classes import get_typed_class
-from CimTest import Globals, CimExt
+from CimTest import Globals, CimExt, Cache
 from VirtLib import utils
 from CimTest.Globals import logger
+from XenKvmLib.cim_conn import get_conn, run_concurrent
+
+# When set, EnumInstances uses the pull operations with this MaxObjectCount
+# if the CIMOM and pywbem support them.
+max_object_count = int(os.getenv('CIM_MAX_OBJECT_COUNT', '0'))
+
+# Number of classes enum_dev(), enum_pools() and enum_rasds() enumerate at
+# the same time by default
+enum_jobs = int(os.getenv('CIM_ENUM_JOBS', '1'))
 
 class CIM_Instance:
     def __init__(self, inst):
@@ -77,15 +87,21 @@ class CIM_Instance:
         return self.inst.tomof()
 
 class CIM_CimtestClass(CIM_Instance):
-    def __init__(self, host, ref):
-
-        conn = pywbem.WBEMConnection('http://%s' % host,
-                                     (Globals.CIM_USER, Globals.CIM_PASS),
-                                     Globals.CIM_NS)
-        try:
-            inst = conn.GetInstance(ref)
-        except pywbem.CIMError, arg:
-            raise arg
+    def __init__(self, host, ref, inst=None):
+
+        conn = get_conn(host)
+        if inst is None:
+            key = ('GetInstance', host, Globals.CIM_NS,
+                   Cache.name_key(ref.classname, ref.keybindings))
+            found, inst = Cache.lookup(key)
+            if found:
+                inst = inst.copy()
+            else:
+                try:
+                    inst = conn.GetInstance(ref)
+                except pywbem.CIMError, arg:
+                    raise arg
+                Cache.store(key, [ref.classname], inst.copy())
 
         self.conn = conn
         self.inst = inst
@@ -123,9 +139,12 @@ def EnumNames(host, cn):
     '''Resolve the enumeration given the @cn.
     Return a list of CIMInstanceName objects.'''
 
-    conn = pywbem.WBEMConnection('http://%s' % host,
-                                 (Globals.CIM_USER, Globals.CIM_PASS),
-                                 Globals.CIM_NS)
+    key = ('EnumerateInstanceNames', host, Globals.CIM_NS, cn)
+    found, names = Cache.lookup(key)
+    if found:
+        return [name.copy() for name in names]
+
+    conn = get_conn(host)
 
     names = []
 
@@ -135,29 +154,80 @@ def EnumNames(host, cn):
         print arg[1]
         return names
 
+    Cache.store(key, [cn] + [name.classname for name in names],
+                [name.copy() for name in names])
     return names
 
+def pull_instances(conn, cn):
+    '''Enumerate @cn using OpenEnumerateInstances and PullInstancesWithPath.
+    Return None if the pull operations are not available.'''
+
+    if not hasattr(pywbem.WBEMConnection, 'OpenEnumerateInstances'):
+        return None
+
+    try:
+        res = conn.OpenEnumerateInstances(cn, DeepInheritance=True,
+                                          MaxObjectCount=max_object_count)
+    except pywbem.CIMError, arg:
+        if arg[0] == pywbem.CIM_ERR_NOT_SUPPORTED:
+            return None
+        raise
+
+    insts = list(res.instances)
+    while not res.eos:
+        res = conn.PullInstancesWithPath(res.context,
+                                         MaxObjectCount=max_object_count)
+        insts.extend(res.instances)
+
+    return insts
+
 def EnumInstances(host, cn, ret_cim_inst=False):
     '''Resolve the enumeration given the @cn.
     Return a list of CIMInstance objects.'''
 
-    refs = []
+    key = ('EnumerateInstances', host, Globals.CIM_NS, cn)
+    found, insts = Cache.lookup(key)
+    if found:
+        insts = [inst.copy() for inst in insts]
+    else:
+        conn = get_conn(host)
 
-    try:
-        refs = EnumNames(host, cn)
-    except pywbem.CIMError, arg:
-        print arg[1]
+        try:
+            if max_object_count > 0:
+                insts = pull_instances(conn, cn)
+
+            if insts is None:
+                insts = conn.EnumerateInstances(cn, LocalOnly=False,
+                                                DeepInheritance=True)
+        except pywbem.CIMError, arg:
+            print arg[1]
+            return []
+
+        Cache.store(key, [cn] + [inst.classname for inst in insts],
+                    [inst.copy() for inst in insts])
+
+    if ret_cim_inst:
+        return insts
 
     list = []
 
-    for name in refs:
-        inst = CIM_CimtestClass(host, name)
-        if ret_cim_inst:
-            inst = inst.inst
-        list.append(inst)
+    for inst in insts:
+        list.append(CIM_CimtestClass(host, inst.path, inst))
  
     return list
 
+def EnumInstancesMany(host, cns, jobs=enum_jobs):
+    '''Return the EnumInstances() of each class in @cns, in the same
+    order.  Up to @jobs classes are enumerated at the same time, each
+    thread using its own traced connection from get_conn().'''
+
+    results = run_concurrent(lambda cn: EnumInstances(host, cn), cns, jobs)
+    for insts, error in results:
+        if error is not None:
+            raise error
+
+    return [insts for insts, error in results]
+
 def GetInstance(host, cn, keys, ret_cim_inst=False):
     '''Resolve the enumeration given the @cn.
     Return a list of CIMInstance objects.'''
@@ -0,0 +1,284 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# History of test runs kept in a SQLite file (main.py --history).
+#
+# Each run records the provider revision, libvirt and hypervisor version
+# and host environment it ran against, along with the status and
+# duration of every test.  regressions() compares the durations of a run
+# with the median of the previous runs of the same tests on the same
+# host and virt type, which is how slowdowns in the providers show up.
+# Run this module with the history file to report on its latest run.
+
+import sys
+from time import time
+from optparse import OptionParser
+from CimTest.Globals import logger
+from XenKvmLib.const import get_provider_version
+from XenKvmLib.reporting import get_env_data, get_libvirt_ver
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# Number of previous runs a test's duration is compared with
+HISTORY_WINDOW = 10
+
+# A test regressed when it ran this many percent slower than its median
+REGRESS_THRESHOLD = 25
+
+# Tests faster than this many seconds are too noisy to compare
+MIN_TIME = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    virt TEXT,
+    host TEXT,
+    distro TEXT,
+    provider_rev INTEGER,
+    provider_changeset TEXT,
+    libvirt_ver TEXT,
+    hyp_ver TEXT,
+    env TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER REFERENCES runs(id),
+    grp TEXT,
+    test TEXT,
+    status TEXT,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS results_test ON results (grp, test);
+"""
+
+def _connect(db_file):
+    if sqlite3 is None:
+        logger.error("sqlite3 is not available, no run history kept")
+        return None
+
+    try:
+        db = sqlite3.connect(db_file)
+        db.executescript(SCHEMA)
+    except sqlite3.Error, details:
+        logger.error("Unable to open run history %s: %s", db_file, details)
+        return None
+
+    return db
+
+def median(vals):
+    vals = sorted(vals)
+    mid = len(vals) / 2
+    if len(vals) % 2:
+        return vals[mid]
+    return (vals[mid - 1] + vals[mid]) / 2.0
+
+def record_run(db_file, virt, ip, records):
+    '''Add a run of the tests in @records, the result records of
+    TestSuite, against @ip to the history in @db_file.  Return the id
+    of the run or None.'''
+
+    db = _connect(db_file)
+    if db is None:
+        return None
+
+    rev, changeset = get_provider_version(virt, ip)
+    libvirt_ver, hyp_ver = get_libvirt_ver(ip)
+    env, distro = get_env_data(ip, virt)
+
+    try:
+        try:
+            cur = db.execute("INSERT INTO runs (started, virt, host, "
+                             "distro, provider_rev, provider_changeset, "
+                             "libvirt_ver, hyp_ver, env) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (time(), virt, ip, distro, rev, str(changeset),
+                              libvirt_ver, hyp_ver, env))
+            run_id = cur.lastrowid
+            db.executemany("INSERT INTO results (run_id, grp, test, status, "
+                           "time) VALUES (?, ?, ?, ?, ?)",
+                           [(run_id, rec['group'], rec['test'],
+                             rec['status'], rec['time'])
+                            for rec in records])
+            db.commit()
+        except sqlite3.Error, details:
+            logger.error("Unable to record run in %s: %s", db_file, details)
+            return None
+    finally:
+        db.close()
+
+    return run_id
+
+def latest_run(db_file):
+    '''Return the id of the last run recorded in @db_file or None.'''
+
+    db = _connect(db_file)
+    if db is None:
+        return None
+
+    try:
+        try:
+            return db.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+        except sqlite3.Error, details:
+            logger.error("Unable to read run history %s: %s", db_file,
+                         details)
+            return None
+    finally:
+        db.close()
+
+def test_durations(db_file, virt, window=HISTORY_WINDOW):
+    '''Return the median duration of each test over the last @window
+    runs of @virt tests on any host, as a dict of (group, test) :
+    seconds.'''
+
+    db = _connect(db_file)
+    if db is None:
+        return {}
+
+    times = {}
+    try:
+        try:
+            rows = db.execute("SELECT id FROM runs WHERE virt = ? "
+                              "ORDER BY id DESC LIMIT ?",
+                              (virt, window)).fetchall()
+            for (run_id,) in rows:
+                for group, test, secs in db.execute("SELECT grp, test, time "
+                                                    "FROM results WHERE "
+                                                    "run_id = ?", (run_id,)):
+                    if secs is not None:
+                        times.setdefault((group, test), []).append(secs)
+        except sqlite3.Error, details:
+            logger.error("Unable to read run history %s: %s", db_file,
+                         details)
+    finally:
+        db.close()
+
+    return dict([(key, median(vals)) for key, vals in times.items()])
+
+def regressions(db_file, run_id, threshold=REGRESS_THRESHOLD,
+                window=HISTORY_WINDOW):
+    '''Return the tests of run @run_id that took more than @threshold
+    percent longer than their median over the @window previous runs on
+    the same host and virt type.  Only passing runs are compared.  Each
+    test is a dict of group, test, time, median, runs and the slowdown
+    in percent, the worst one first.'''
+
+    db = _connect(db_file)
+    if db is None:
+        return []
+
+    found = []
+    try:
+        try:
+            run = db.execute("SELECT virt, host FROM runs WHERE id = ?",
+                             (run_id,)).fetchone()
+            if run is None:
+                return []
+
+            current = db.execute("SELECT grp, test, time FROM results "
+                                 "WHERE run_id = ? AND status = 'PASS'",
+                                 (run_id,)).fetchall()
+            for group, test, secs in current:
+                rows = db.execute("SELECT results.time FROM results, runs "
+                                  "WHERE results.run_id = runs.id "
+                                  "AND runs.id < ? AND runs.virt = ? "
+                                  "AND runs.host = ? AND results.grp = ? "
+                                  "AND results.test = ? "
+                                  "AND results.status = 'PASS' "
+                                  "ORDER BY runs.id DESC LIMIT ?",
+                                  (run_id, run[0], run[1], group, test,
+                                   window)).fetchall()
+                if not rows or secs is None:
+                    continue
+
+                base = median([row[0] for row in rows])
+                if base < MIN_TIME:
+                    continue
+
+                slowdown = (secs - base) * 100 / base
+                if slowdown > threshold:
+                    found.append({ 'group'    : group,
+                                   'test'     : test,
+                                   'time'     : secs,
+                                   'median'   : base,
+                                   'runs'     : len(rows),
+                                   'slowdown' : slowdown,
+                                 })
+        except sqlite3.Error, details:
+            logger.error("Unable to read run history %s: %s", db_file,
+                         details)
+    finally:
+        db.close()
+
+    found.sort(key=lambda reg: reg['slowdown'], reverse=True)
+    return found
+
+def regression_report(db_file, run_id, threshold=REGRESS_THRESHOLD,
+                      window=HISTORY_WINDOW):
+    '''Return the lines of a report of the regressions() of run
+    @run_id.'''
+
+    regs = regressions(db_file, run_id, threshold, window)
+    if not regs:
+        return ["No test ran more than %d%% slower than its median" %
+                threshold]
+
+    lines = ["Tests more than %d%% slower than their median:" % threshold,
+             "  %-56s %9s %9s %5s %8s" % ("Test", "Time(s)", "Median(s)",
+                                          "Runs", "Slower")]
+    for reg in regs:
+        lines.append("  %-56s %9.3f %9.3f %5d %7.0f%%" %
+                     ("%s - %s" % (reg['group'], reg['test']), reg['time'],
+                      reg['median'], reg['runs'], reg['slowdown']))
+
+    return lines
+
+def main():
+    parser = OptionParser(usage="%prog [options] HISTORY_FILE")
+    parser.add_option("-r", "--run", dest="run", type="int",
+                      help="Run to report on (default: the latest run)")
+    parser.add_option("--regress-threshold", dest="threshold", type="int",
+                      default=REGRESS_THRESHOLD,
+                      help="Percent slowdown reported as a regression "
+                           "(default: %d)" % REGRESS_THRESHOLD)
+    parser.add_option("--history-window", dest="window", type="int",
+                      default=HISTORY_WINDOW,
+                      help="Number of previous runs to compare with "
+                           "(default: %d)" % HISTORY_WINDOW)
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        return 1
+
+    run_id = options.run
+    if run_id is None:
+        run_id = latest_run(args[0])
+        if run_id is None:
+            print "No runs recorded in %s" % args[0]
+            return 1
+
+    for line in regression_report(args[0], run_id, options.threshold,
+                                  options.window):
+        print line
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
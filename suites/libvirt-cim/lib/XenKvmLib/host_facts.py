@@ -0,0 +1,191 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# Cache of facts about the host under test (provider version, hypervisor
+# version, CPU model, ...) keyed by (ip, virt).
+#
+# Facts are kept in memory and, when CIM_FACTS_FILE is set, shared with
+# other processes through that file.  main.py fills the file once per run
+# and exports CIM_FACTS_FILE to the tests it starts.  Failed probes
+# (None results) are not cached.
+
+import os
+import inspect
+import threading
+from CimTest.Globals import logger
+
+try:
+    import json
+except ImportError:
+    json = None
+
+_facts = None
+_facts_lock = threading.Lock()
+
+def _from_json(val):
+    if isinstance(val, list):
+        return tuple([_from_json(x) for x in val])
+    if isinstance(val, unicode):
+        return str(val)
+    return val
+
+def _read_file():
+    facts_file = os.getenv('CIM_FACTS_FILE')
+    if not facts_file or json is None or not os.path.exists(facts_file):
+        return {}
+
+    try:
+        f = open(facts_file)
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError), details:
+        logger.error("Unable to read host facts from %s: %s", facts_file,
+                     details)
+        return {}
+
+    facts = {}
+    for key, val in data.items():
+        facts[str(key)] = _from_json(val)
+
+    return facts
+
+def _write_file(facts):
+    facts_file = os.getenv('CIM_FACTS_FILE')
+    if not facts_file or json is None:
+        return
+
+    tmp_file = '%s.%d' % (facts_file, os.getpid())
+    try:
+        f = open(tmp_file, 'w')
+        try:
+            json.dump(facts, f)
+        finally:
+            f.close()
+        os.rename(tmp_file, facts_file)
+    except (IOError, OSError), details:
+        logger.error("Unable to write host facts to %s: %s", facts_file,
+                     details)
+
+def _get_facts():
+    global _facts
+
+    if _facts is None:
+        _facts = _read_file()
+
+    return _facts
+
+def fact_key(name, ip, virt, extra=()):
+    return '|'.join([str(ip), str(virt), name] + [str(x) for x in extra])
+
+def get_fact(key):
+    _facts_lock.acquire()
+    try:
+        return _get_facts().get(key)
+    finally:
+        _facts_lock.release()
+
+def set_fact(key, val):
+    _facts_lock.acquire()
+    try:
+        _get_facts()[key] = val
+
+        # Merge with what other processes have stored meanwhile
+        facts = _read_file()
+        facts[key] = val
+        _write_file(facts)
+    finally:
+        _facts_lock.release()
+
+def invalidate(ip=None, virt=None):
+    '''Drop the cached facts for @ip and @virt.  With no arguments all
+    cached facts are dropped.'''
+
+    def match(key):
+        k_ip, k_virt = key.split('|')[:2]
+        if ip is not None and k_ip != str(ip):
+            return False
+        if virt is not None and k_virt != str(virt):
+            return False
+        return True
+
+    _facts_lock.acquire()
+    try:
+        facts = _get_facts()
+        for key in facts.keys():
+            if match(key):
+                del facts[key]
+
+        file_facts = _read_file()
+        for key in file_facts.keys():
+            if match(key):
+                del file_facts[key]
+        _write_file(file_facts)
+    finally:
+        _facts_lock.release()
+
+def reset():
+    '''Forget the facts kept in memory.  They are read again from
+    CIM_FACTS_FILE when next needed.'''
+
+    global _facts
+
+    _facts_lock.acquire()
+    try:
+        _facts = None
+    finally:
+        _facts_lock.release()
+
+def host_fact(ip_arg, virt_arg=None, skip=(None,)):
+    '''Decorator caching the result of a host probe.  @ip_arg and
+    @virt_arg name the parameters holding the host and virt type; any
+    other parameters are made part of the key.  Results in @skip are
+    not cached.'''
+
+    def decorator(f):
+        args_list, varargs, varkw, defaults = inspect.getargspec(f)
+        if defaults is None:
+            defaults = ()
+
+        def wrapped(*args, **kwargs):
+            params = dict(zip(args_list[len(args_list) - len(defaults):],
+                              defaults))
+            params.update(zip(args_list, args))
+            params.update(kwargs)
+
+            extra = [params.get(a) for a in args_list
+                     if a not in (ip_arg, virt_arg)]
+            key = fact_key(f.__name__, params.get(ip_arg),
+                           params.get(virt_arg), extra)
+
+            val = get_fact(key)
+            if val is not None:
+                return val
+
+            val = f(*args, **kwargs)
+            if val not in skip:
+                set_fact(key, val)
+
+            return val
+
+        wrapped.__name__ = f.__name__
+        wrapped.__doc__ = f.__doc__
+        return wrapped
+
+    return decorator
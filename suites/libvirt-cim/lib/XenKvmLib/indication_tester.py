@@ -92,16 +92,33 @@
 # Same as above but the CIMOM is running on a remote system:
 #
 # $ indication_tester.py --url remotesys:5988 --trigger
+#
+# Benchmark mode subscribes to Test_Indication, sends the given number of
+# triggers and reports how many indications were delivered or lost, the
+# p50/p95/p99 latency from trigger to delivery and the sustained delivery
+# rate.  Run it once with an http and once with an https --dest to compare
+# both listener paths:
+#
+# $ indication_tester.py --bench 1000
+#
+# Same as above but against a local stand-in CIMOM, to measure the listener
+# alone:
+#
+# $ indication_tester.py --bench 1000 --stand-in --url localhost:15988
 
 import sys
 from optparse import OptionParser
 from urlparse import urlparse, urlunparse
-from xml.dom.minidom import parse, parseString
+from xml.parsers import expat
 import httplib
 import base64
-import errno, os, re
+import errno, os, re, math
 import socket
-from SocketServer import BaseServer
+import ssl
+import threading
+from Queue import Queue, Empty
+from time import time
+from SocketServer import BaseServer, ThreadingMixIn
 from SimpleHTTPServer import SimpleHTTPRequestHandler
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 from OpenSSL import SSL
@@ -407,13 +424,54 @@ def update_url_port(parsedUrl, port):
                        parsedUrl.path, parsedUrl.params,
                        parsedUrl.query, parsedUrl.fragment))
 
+# Size of the reads used to parse a delivered indication
+CHUNK_SIZE = 8192
+
+class _InstanceFound(Exception):
+    pass
+
 class CIMIndication:
-    def __init__(self, xmldata):
-        dom = parseString(xmldata)
+    """The class name of a delivered indication, taken from the first
+    INSTANCE of the export request.  The payload can be fed in chunks;
+    parsing stops at that INSTANCE.  The payload itself is only kept, in
+    self.data, when keep_data is set.
+    """
+    def __init__(self, xmldata=None, keep_data=False):
+        self.name = None
+        self.data = None
+        self.keep_data = keep_data
+        self._chunks = []
+        self._parser = expat.ParserCreate()
+        self._parser.StartElementHandler = self._start_element
+
+        if xmldata is not None:
+            self.feed(xmldata)
+            self.close()
 
-        instances = dom.getElementsByTagName("INSTANCE")
-        attrs = instances[0].attributes.items()
-        self.name = attrs[0][1]
+    def _start_element(self, name, attrs):
+        if name == "INSTANCE":
+            self.name = attrs.get("CLASSNAME")
+            raise _InstanceFound()
+
+    def feed(self, chunk):
+        if self.keep_data:
+            self._chunks.append(chunk)
+
+        if self._parser is None:
+            return
+
+        try:
+            self._parser.Parse(chunk, False)
+        except _InstanceFound:
+            self._parser = None
+
+    def close(self):
+        if self.keep_data:
+            self.data = "".join(self._chunks)
+            self._chunks = []
+
+        if self.name is None:
+            raise ValueError("No INSTANCE found in the indication")
 
     def __str__(self):
         return self.name
@@ -431,19 +489,31 @@ class CIMSocketHandler(SimpleHTTPRequestHandler):
         self.wfile = socket._fileobject(self.request, "wb", self.wbufsize)
 
     def do_POST(self):
-        length = self.headers.getheader('content-length')
-        data = self.rfile.read(int(length))
+        length = int(self.headers.getheader('content-length'))
+
+        indication = CIMIndication(keep_data=self.server.print_ind)
+        while length > 0:
+            chunk = self.rfile.read(min(length, CHUNK_SIZE))
+            if not chunk:
+                break
+            length -= len(chunk)
+            indication.feed(chunk)
+        indication.close()
 
-        indication = CIMIndication(data)
         print "Got indication: %s from %s" % (indication, self.client_address)
         if self.server.print_ind:
-            print "%s\n" % data
-        self.server.indications.append(indication)
-        # Silence the unwanted log output from send_response()
-        realStderr = sys.stderr
-        sys.stderr = open(os.devnull,'a')
+            print "%s\n" % indication.data
+
+        listener = getattr(self.server, 'listener', None)
+        if listener is not None:
+            listener.deliver(self.path, indication)
+        else:
+            self.server.indications.append(indication)
         self.send_response(200)
-        sys.stderr = realStderr
+
+    def log_message(self, format, *args):
+        # Silence the unwanted log output from send_response()
+        pass
 
 class SecureHTTPServer(HTTPServer):
     def __init__(self, server_address, HandlerClass):
@@ -474,23 +544,149 @@ class SecureHTTPServer(HTTPServer):
         self.server_bind()
         self.server_activate()
 
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class ThreadingSecureHTTPServer(ThreadingMixIn, SecureHTTPServer):
+    daemon_threads = True
+
+class CIMIndicationListener:
+    """One listener socket shared by several subscriptions.
+
+    Each subscription gets its own handler path below the listener URL
+    (e.g. http://localhost:8006/TestFilterName) and its own queue, so any
+    number of subscriptions can be served by a single port.  Requests are
+    handled in a background thread.
+    """
+
+    def __init__(self, port=0, print_ind=False,
+                 destUrl="http://localhost:8000"):
+        parsedUrl = urlparse(destUrl)
+
+        # Increment the listener port by the offset value.
+        if isinstance(parsedUrl.port, int):
+          listenerPort = parsedUrl.port + port
+        else:
+          listenerPort = 8000 + port
+
+        self.url = update_url_port(parsedUrl, listenerPort).rstrip("/")
+        self.queues = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+        try:
+            if parsedUrl.scheme == "https":
+                self.server = ThreadingSecureHTTPServer((parsedUrl.hostname,
+                                                         listenerPort),
+                                                        socket_handler_wrapper)
+            else:
+                self.server = ThreadingHTTPServer((parsedUrl.hostname,
+                                                   listenerPort),
+                                                  CIMSocketHandler)
+        except IOError as e:
+            print "Error creating listener socket: %s" % str(e)
+            exit(e.errno)
+
+        self.server.print_ind = print_ind
+        self.server.listener = self
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.server.serve_forever)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread = None
+        self.server.server_close()
+
+    def handler_url(self, name):
+        return "%s/%s" % (self.url, name)
+
+    def add(self, name):
+        self.lock.acquire()
+        self.queues["/%s" % name] = Queue()
+        self.lock.release()
+
+    def remove(self, name):
+        self.lock.acquire()
+        self.queues.pop("/%s" % name, None)
+        self.lock.release()
+
+    def deliver(self, path, indication):
+        self.lock.acquire()
+        queue = self.queues.get(path)
+        self.lock.release()
+
+        if queue is None:
+            print "Dropping indication %s for unknown handler %s" % \
+                  (indication, path)
+            return
+
+        queue.put((time(), indication))
+
+    def receive(self, name, timeout):
+        """Wait up to timeout seconds for the next indication delivered to
+        the handler of subscription name.  Returns a (time received,
+        indication) tuple or None.
+        """
+        self.lock.acquire()
+        queue = self.queues.get("/%s" % name)
+        self.lock.release()
+
+        if queue is None or timeout <= 0:
+            return None
+
+        try:
+            return queue.get(True, timeout)
+        except Empty:
+            return None
+
+    def wait(self, name, ind_name, timeout):
+        """Wait up to timeout seconds for an indication of class ind_name
+        on the handler of subscription name.  Indications of other classes
+        are discarded.  Returns the indication or None.
+        """
+        deadline = time() + timeout
+        while True:
+            item = self.receive(name, deadline - time())
+            if item is None:
+                return None
+
+            received, indication = item
+            if str(indication) == ind_name:
+                return indication
+
 # The param defaults allow new options from main() w/o losing compat w/ cimtest.
 class CIMIndicationSubscription:
     def __init__(self, name, typ, ns, print_ind, sysname, port=0,
             interopNS=('root','PG_InterOp'), destUrl="http://localhost:8000",
-            triggermode=False):
+            triggermode=False, listener=None):
         self.name = name
         self.type = typ
         self.ns = ns
         self.sysname = sysname
         self.interopNS = interopNS
         self.print_ind = print_ind
+        self.listener = listener
 
         # We do not want to open a listener socket in trigger mode.
         if triggermode:
           self.trigger_xml = trigger_xml(typ, interopNS)
           return
 
+        # Deliveries go to our own path on the shared listener.
+        if listener is not None:
+            listener.add(name)
+            self.server = None
+            self.filter_xml = filter_xml(name, typ, ns, sysname, interopNS)
+            self.handler_xml = handler_xml(name, listener.handler_url(name),
+                                           sysname, interopNS)
+            self.subscription_xml = subscription_xml(name, sysname, interopNS)
+            return
+
         parsedUrl = urlparse(destUrl)
 
         # Increment the listener port by the offset value.
@@ -588,6 +784,12 @@ class CIMIndicationSubscription:
         self.__do_cimpost(self.conn, xml,
                           "DeleteInstance", auth_hdr)
 
+        if self.listener is not None:
+            self.listener.remove(self.name)
+
+    def wait_for(self, ind_name, timeout):
+        return self.listener.wait(self.name, ind_name, timeout)
+
     def trigger(self, url, cred=None):
         self.conn = httplib.HTTPConnection(url)
         if cred:
@@ -599,6 +801,240 @@ class CIMIndicationSubscription:
         self.__do_cimpost(self.conn, self.trigger_xml,
                           "SendTestIndication", auth_hdr)
 
+def export_indication_xml(type, msg_id):
+    return """<?xml version="1.0" encoding="utf-8"?>
+    <CIM CIMVERSION="2.0" DTDVERSION="2.0">
+      <MESSAGE ID="%d" PROTOCOLVERSION="1.0">
+        <SIMPLEEXPREQ>
+          <EXPMETHODCALL NAME="ExportIndication">
+            <EXPPARAMVALUE NAME="NewIndication">
+              <INSTANCE CLASSNAME="%s">
+                <PROPERTY NAME="IndicationIdentifier" TYPE="string">
+                  <VALUE>%d</VALUE>
+                </PROPERTY>
+              </INSTANCE>
+            </EXPPARAMVALUE>
+          </EXPMETHODCALL>
+        </SIMPLEEXPREQ>
+      </MESSAGE>
+    </CIM>
+    """ % (msg_id, type, msg_id)
+
+def cim_response_xml(method):
+    return """<?xml version="1.0" encoding="utf-8"?>
+    <CIM CIMVERSION="2.0" DTDVERSION="2.0">
+      <MESSAGE ID="4711" PROTOCOLVERSION="1.0">
+        <SIMPLERSP>
+          <IMETHODRESPONSE NAME="%s"/>
+        </SIMPLERSP>
+      </MESSAGE>
+    </CIM>
+    """ % method
+
+class StandInCIMOMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length'))
+        body = self.rfile.read(length)
+        method = self.headers.getheader('CIMMethod')
+
+        self.server.cimom.handle(method, body)
+
+        reply = cim_response_xml(method)
+        self.send_response(200)
+        self.send_header("Content-Type", 'application/xml; charset="utf-8"')
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInCIMOM:
+    """A minimal local CIMOM for benchmarking the listener without sfcb.
+
+    It accepts the CreateInstance and DeleteInstance requests sent by
+    CIMIndicationSubscription, remembers the Destination of each handler
+    and answers SendTestIndication by exporting one indication of the
+    triggered class to every registered handler.  Deliveries are made
+    from a background thread, as a CIMOM would.  The https listener can
+    only be driven with --noverify, the stand-in has no certificate.
+    """
+
+    def __init__(self, url):
+        if ":" in url:
+            (host, port) = url.split(":")
+        else:
+            (host, port) = (url, 5988)
+
+        self.destinations = {}
+        self.lock = threading.Lock()
+        self.deliveries = Queue()
+        self.msg_id = 0
+        self.threads = []
+
+        self.server = ThreadingHTTPServer((host, int(port)),
+                                          StandInCIMOMHandler)
+        self.server.cimom = self
+
+    def start(self):
+        for target in [self.server.serve_forever, self.__deliver]:
+            t = threading.Thread(target=target)
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        self.deliveries.put(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, body):
+        inst = re.search(r'<INSTANCE CLASSNAME="([^"]+)"', body)
+        inst_name = re.search(r'<INSTANCENAME CLASSNAME="([^"]+)"', body)
+
+        if method == "CreateInstance" and inst and \
+           inst.group(1) == "CIM_IndicationHandlerCIMXML":
+            name = re.search(r'NAME="Name".*?<VALUE>(.*?)</VALUE>', body,
+                             re.S).group(1)
+            dest = re.search(r'NAME="Destination".*?<VALUE>(.*?)</VALUE>',
+                             body, re.S).group(1)
+            self.lock.acquire()
+            self.destinations[name.strip()] = dest.strip()
+            self.lock.release()
+
+        elif method == "DeleteInstance" and inst_name and \
+             inst_name.group(1) == "CIM_IndicationHandlerCIMXML":
+            name = re.findall(r'<KEYBINDING NAME="Name">\s*<KEYVALUE>(.*?)<',
+                              body, re.S)
+            if name:
+                self.lock.acquire()
+                self.destinations.pop(name[-1].strip(), None)
+                self.lock.release()
+
+        elif method == "SendTestIndication":
+            cn = re.search(r'<CLASSNAME NAME="([^"]+)"', body).group(1)
+            self.lock.acquire()
+            self.msg_id += 1
+            msg_id = self.msg_id
+            dests = self.destinations.values()
+            self.lock.release()
+
+            for dest in dests:
+                self.deliveries.put((dest, export_indication_xml(cn, msg_id)))
+
+    def __deliver(self):
+        while True:
+            item = self.deliveries.get()
+            if item is None:
+                return
+
+            (dest, body) = item
+            parsedUrl = urlparse(dest)
+            if parsedUrl.scheme == "https":
+                # The listener certificate is usually self signed
+                if hasattr(ssl, "_create_unverified_context"):
+                    conn = httplib.HTTPSConnection(parsedUrl.hostname,
+                                    parsedUrl.port,
+                                    context=ssl._create_unverified_context())
+                else:
+                    conn = httplib.HTTPSConnection(parsedUrl.hostname,
+                                                   parsedUrl.port)
+            else:
+                conn = httplib.HTTPConnection(parsedUrl.hostname,
+                                              parsedUrl.port)
+
+            headers = {"CIMExport"    : "MethodRequest",
+                       "CIMExportMethod" : "ExportIndication",
+                       "Content-Type" : 'application/xml; charset="utf-8"'}
+            try:
+                conn.request("POST", parsedUrl.path or "/", body, headers)
+                conn.getresponse().read()
+            except (IOError, httplib.HTTPException), e:
+                print "Stand-in CIMOM failed to deliver to %s: %s" % \
+                      (dest, str(e))
+            conn.close()
+
+def percentile(values, pct):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return 0
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+def run_bench(options, sysname, destUrl, auth):
+    """Subscribe, send options.bench triggers and report how many of the
+    indications were delivered, their end-to-end latency and the sustained
+    delivery rate.
+    """
+    classname = "Test_Indication"
+    scheme = urlparse(destUrl).scheme
+
+    cimom = None
+    if options.stand_in:
+        cimom = StandInCIMOM(options.url)
+        cimom.start()
+
+    listener = CIMIndicationListener(options.port, options.print_ind, destUrl)
+    listener.start()
+
+    sub = CIMIndicationSubscription(options.name, classname, options.ns,
+                                    options.print_ind, sysname,
+                                    interopNS=options.interopNS,
+                                    listener=listener)
+    trig = CIMIndicationSubscription(options.name, classname, options.ns,
+                                     options.print_ind, sysname,
+                                     interopNS=options.interopNS,
+                                     triggermode=True)
+
+    sent = []
+    received = []
+    try:
+        print "Creating subscription for %s" % classname
+        sub.subscribe(options.url, auth)
+
+        print "Sending %d triggers (%s listener)" % (options.bench, scheme)
+        for i in range(0, options.bench):
+            sent.append(time())
+            trig.trigger(options.url, auth)
+
+        deadline = time() + options.bench_timeout
+        while len(received) < len(sent):
+            item = listener.receive(options.name, deadline - time())
+            if item is None:
+                break
+            received.append(item[0])
+    finally:
+        print "Cancelling subscription for %s" % classname
+        sub.unsubscribe(auth, options.url)
+        listener.stop()
+        if cimom is not None:
+            cimom.stop()
+
+    # Test_Indication carries nothing that ties it to its trigger, so the
+    # n-th indication delivered is matched with the n-th trigger sent.
+    latencies = [(r - s) * 1000 for s, r in zip(sent, received)]
+    latencies.sort()
+
+    print "Benchmark results (%s listener):" % scheme
+    print "  triggered: %d  delivered: %d  lost: %d" % \
+          (len(sent), len(received), len(sent) - len(received))
+
+    if not received:
+        return 1
+
+    print "  latency ms: p50 %.2f  p95 %.2f  p99 %.2f  max %.2f" % \
+          (percentile(latencies, 50), percentile(latencies, 95),
+           percentile(latencies, 99), latencies[-1])
+
+    elapsed = received[-1] - sent[0]
+    if elapsed > 0:
+        print "  throughput: %.1f indications/sec" % (len(received) / elapsed)
+
+    if len(received) < len(sent):
+        return 1
+
+    return 0
+
 def dump_xml(name, typ, ns, sysname, interopNS, destUrl):
     filter_str = filter_xml(name, typ, ns, sysname, interopNS)
     handler_str = handler_xml(name, destUrl, sysname, interopNS)
@@ -670,10 +1106,21 @@ def main():
                       action="store_true",
                       help="Trigger mode: send a request to CIMOM to trigger \
                       an indication via a method call ")
+    parser.add_option("-b", "--bench", dest="bench", default=0, type=int,
+                      help="Benchmark mode: subscribe, send this many \
+                      triggers and report delivery, latency and throughput")
+    parser.add_option("--bench-timeout", dest="bench_timeout", default=30,
+                      type=float,
+                      help="Seconds to wait for outstanding indications \
+                      after the last trigger (default: 30)")
+    parser.add_option("--stand-in", dest="stand_in", default=False,
+                      action="store_true",
+                      help="Benchmark mode: serve --url with a local \
+                      stand-in CIMOM instead of a real one")
 
     (options, args) = parser.parse_args()
 
-    if not options.trigger and len(args)==0:
+    if not options.trigger and not options.bench and len(args)==0:
         print "Fatal: no indication type provided."
         sys.exit(1)
 
@@ -733,6 +1180,10 @@ def main():
                  destUrl)
         sys.exit(0)
 
+    # Benchmark mode: like trigger mode, only supports Test_Indication.
+    if options.bench > 0:
+        sys.exit(run_bench(options, sysname, destUrl, auth))
+
     # Trigger mode: currently only supports SFCB Test_Indication provider.
     if options.trigger:
         classname = "Test_Indication"
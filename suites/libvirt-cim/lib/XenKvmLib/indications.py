@@ -21,31 +21,40 @@
 #
 #
 
-from signal import SIGKILL
-from time import sleep
 from CimTest.Globals import logger
-from XenKvmLib.indication_tester import CIMIndicationSubscription
+from XenKvmLib.indication_tester import CIMIndicationSubscription, \
+                                        CIMIndicationListener
 from XenKvmLib.vxml import set_default
 from XenKvmLib.classes import get_typed_class
+from XenKvmLib.const import ind_port_offset
 from CimTest.ReturnCodes import PASS, FAIL
-from os import waitpid, kill, WNOHANG
+
+# Seconds to wait for an expected indication
+IND_TIMEOUT = 20
 
 def sub_ind(ip, virt, ind_names):
+    """Subscribe to the indications in ind_names, a dict of key : class
+    basename.  All subscriptions share a single listener, delivering to
+    a handler path of their own.  The class basenames in ind_names are
+    replaced with the typed class names.
+    """
     dict = set_default(ip)
     sub_list = {}
-    port = 5
+
+    listener = CIMIndicationListener(6 + ind_port_offset,
+                                     dict['default_print_ind'])
+    listener.start()
 
     for ind, iname in ind_names.iteritems():
         ind_name = get_typed_class(virt, iname)
 
         sub_name = "Test%s" % ind_name
-        port += 1
 
         sub = CIMIndicationSubscription(sub_name, ind_name,
                                         dict['default_ns'],
                                         dict['default_print_ind'],
                                         dict['default_sysname'],
-                                        port)
+                                        listener=listener)
         sub.subscribe(dict['default_url'], dict['default_auth'])
         logger.info("Watching for %s", iname)
         ind_names[ind] = ind_name
@@ -53,53 +62,25 @@ def sub_ind(ip, virt, ind_names):
 
     return sub_list, ind_names, dict
 
-def handle_request(sub, ind_name, dict, exp_ind_ct):
+def wait_for_ind(sub, ind_name, timeout=IND_TIMEOUT):
     #sfcb delivers indications to all registrations, even if the indication
     #isn't what the registration was subscribed to.  So, for modified and 
-    #deleted indications, we must loop through until the indication we are
-    #looking for is triggered.
-    for i in range(0, exp_ind_ct):
-        sub.server.handle_request() 
-        if len(sub.server.indications) < 1:
-            logger.error("No valid indications received")
-            return FAIL
-
-        if str(sub.server.indications[0]) == ind_name:
-                sub.unsubscribe(dict['default_auth'])
-                logger.info("Cancelling subscription for %s", ind_name)
-                return PASS
-        else:
-                sub.server.indications.remove(sub.server.indications[0])
-
-    logger.error("Did not recieve indication %s", ind_name)
-    return FAIL
-
-def poll_for_ind(pid, ind_name, timeout=20):
-    status = FAIL
-    for i in range(0, timeout):
-        pw = waitpid(pid, WNOHANG)
+    #deleted indications, we must skip over the ones we are not looking for.
+    logger.info("Waiting for '%s' indication", ind_name)
+    if sub.wait_for(ind_name, timeout) is None:
+        logger.error("Waited too long for '%s' indication", ind_name)
+        return FAIL
 
-        # If pid exits, waitpid returns [pid, return_code] 
-        # If pid is still running, waitpid returns [0, 0]
-        # Only return a success if waitpid returns the expected pid
-        # and the return code is 0.
-        if pw[0] == pid and pw[1] == 0:
-            logger.info("Great, got '%s' indication successfully", ind_name)
-            status = PASS
-            break
-        elif pw[1] == 0 and i < timeout:
-            if i % 10 == 0:
-                logger.info("In child, waiting for '%s' indication", ind_name)
-            sleep(1)
-        else:
-            # Time is up and waitpid never returned the expected pid
-            if pw[0] != pid:
-                logger.error("Waited too long for '%s' indication", ind_name)
-                kill(pid, SIGKILL)
-            else:
-                logger.error("Received Indication error: '%d'", pw[1])
+    logger.info("Great, got '%s' indication successfully", ind_name)
+    return PASS
 
-            status = FAIL
-            break
+def unsub_ind(sub_list, ind_names, dict):
+    listeners = []
+    for ind, sub in sub_list.iteritems():
+        sub.unsubscribe(dict['default_auth'])
+        logger.info("Cancelling subscription for %s", ind_names[ind])
+        if sub.listener not in listeners:
+            listeners.append(sub.listener)
 
-    return status
+    for listener in listeners:
+        listener.stop()
@@ -24,10 +24,12 @@ import sys
 import os
 from VirtLib import utils
 from CimTest.Globals import logger, CIM_NS
+from CimTest import Cache
 from CimTest.ReturnCodes import PASS, FAIL, SKIP
 from XenKvmLib.classes import get_typed_class, inst_to_mof
 from XenKvmLib.const import get_provider_version, default_pool_name 
-from XenKvmLib.enumclass import EnumInstances, GetInstance, EnumNames
+from XenKvmLib.enumclass import EnumInstances, GetInstance, EnumNames, \
+                                EnumInstancesMany, enum_jobs
 from XenKvmLib.assoc import Associators
 from VirtLib.utils import run_remote
 from XenKvmLib.xm_virt_util import virt2uri, net_list, vol_delete
@@ -75,7 +77,7 @@ def pool_cn_to_rasd_cn(pool_cn, virt):
     else:
         return None
 
-def enum_pools(virt, ip):
+def enum_pools(virt, ip, jobs=enum_jobs):
     pool_list = ['ProcessorPool', 'MemoryPool', 'NetworkPool', 'DiskPool']
 
     curr_cim_rev, changeset = get_provider_version(virt, ip)
@@ -89,10 +91,9 @@ def enum_pools(virt, ip):
     pool_insts = {}
 
     try:
-        for pool in pool_list:
-            pool_cn = get_typed_class(virt, pool)
-            list = EnumInstances(ip, pool_cn)
-
+        pool_cns = [get_typed_class(virt, pool) for pool in pool_list]
+        for pool_cn, list in zip(pool_cns,
+                                 EnumInstancesMany(ip, pool_cns, jobs)):
             if len(list) < 1:
                 raise Exception("%s did not return any instances" % pool_cn)
 
@@ -173,6 +174,7 @@ def net_undefine(network, server, virt="Xen"):
 
     cmd = "virsh -c %s net-undefine %s 2>/dev/null" % (virt2uri(virt), network)
     ret, out = run_remote(server, cmd)
+    Cache.invalidate()
 
     return ret
 
@@ -196,6 +198,7 @@ def undefine_diskpool(server, virt, dp_name):
         cmd = "virsh -c %s pool-undefine %s 2>/dev/null" % \
               (virt2uri(virt), dp_name)
         ret, out = run_remote(server, cmd)
+        Cache.invalidate()
         if ret != 0:
             logger.error("Failed to undefine pool '%s'", dp_name)
             return FAIL
@@ -26,7 +26,9 @@ from CimTest.ReturnCodes import FAIL, PASS
 from XenKvmLib import vxml
 from XenKvmLib import const
 from XenKvmLib.classes import get_typed_class, get_class_type
-from XenKvmLib.enumclass import GetInstance, EnumInstances
+from XenKvmLib.enumclass import GetInstance, EnumInstances, \
+                                EnumInstancesMany, enum_jobs
+from XenKvmLib.cim_conn import get_conn
 from XenKvmLib.assoc import Associators 
 from XenKvmLib.const import default_pool_name, default_network_name, \
                             get_provider_version, default_net_type
@@ -342,12 +344,24 @@ def rasd_cn_to_pool_cn(rasd_cn, virt):
     else:
         return None 
 
-def enum_rasds(virt, ip):
+def enum_rasds(virt, ip, jobs=enum_jobs):
     rasd_insts = {}
 
     try:
         rasd_cn = get_typed_class(virt, 'ResourceAllocationSettingData')
-        enum_list = EnumInstances(ip, rasd_cn)
+        if jobs > 1:
+            # Enumerate each RASD subclass on its own, keeping only the
+            # instances of the class itself so none is counted twice.
+            # The base class is left out, its deep enumeration would
+            # fetch every RASD again.
+            cns = get_conn(ip).EnumerateClassNames(ClassName=rasd_cn,
+                                                   DeepInheritance=True)
+            enum_list = []
+            for cn, list in zip(cns, EnumInstancesMany(ip, cns, jobs)):
+                enum_list.extend([rasd for rasd in list
+                                  if rasd.Classname == cn])
+        else:
+            enum_list = EnumInstances(ip, rasd_cn)
 
         if enum_list < 1:
             logger.error("No RASD instances returned")
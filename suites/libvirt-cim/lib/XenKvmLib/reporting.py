@@ -25,6 +25,7 @@ import smtplib
 from time import gmtime, strftime
 from VirtLib import utils
 from XenKvmLib.const import get_provider_version 
+from TestSuite import read_results
 
 def get_cmd_val(cmd, ip):
     rc, out = utils.run_remote(ip, cmd)
@@ -143,6 +144,43 @@ def parse_run_output(log_file):
 
     return rvals, tstr, run_output, exec_time
 
+def parse_run_results(log_file, records):
+    rvals = { 'PASS' : 0,
+              'FAIL' : 0,
+              'XFAIL' : 0,
+              'SKIP' : 0,
+            }
+
+    tstr = { 'PASS' : "",
+             'FAIL' : "",
+             'XFAIL' : "",
+             'SKIP' : "",
+           }
+
+    total_time = 0
+    for rec in records:
+        status = rec['status']
+        rvals[status] += 1
+        if status == 'XFAIL':
+            tstr[status] += "%s - %s: %s\tBug: %s\n" % (rec['group'],
+                            rec['test'], status, rec['bug'])
+        else:
+            tstr[status] += "%s - %s: %s\n" % (rec['group'], rec['test'],
+                                                status)
+        total_time += rec['time'] or 0
+
+    exec_time = "Total test execution: %.3f seconds\n" % total_time
+
+    # The full report is still the log of the run
+    fd = open(log_file, "r")
+    run_output = ""
+    for line in fd.xreadlines():
+        if line.find("Total test execution") < 0:
+            run_output += line
+    fd.close()
+
+    return rvals, tstr, run_output, exec_time
+
 def build_report_body(rvals, tstr, div):
     results = ""
     test_total = 0
@@ -160,7 +198,7 @@ def build_report_body(rvals, tstr, div):
 
     return results, results_total, test_block
 
-def gen_report(virt, ip, log_file):
+def gen_report(virt, ip, log_file, results_file=None):
     date = strftime("%b %d %Y", gmtime())
 
     cimom, cimom_ver = get_cimom_ver(ip)
@@ -172,7 +210,15 @@ def gen_report(virt, ip, log_file):
 
     divider = "=================================================\n"
 
-    rvals, tstr, run_output, exec_time = parse_run_output(log_file)
+    records = None
+    if results_file is not None:
+        records = read_results(results_file)
+
+    if records is not None:
+        rvals, tstr, run_output, exec_time = parse_run_results(log_file,
+                                                               records)
+    else:
+        rvals, tstr, run_output, exec_time = parse_run_output(log_file)
 
     res, res_total, test_block = build_report_body(rvals, tstr, divider)
 
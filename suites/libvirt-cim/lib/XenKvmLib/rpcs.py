@@ -22,12 +22,11 @@ import pywbem
 from pywbem.cim_obj import CIMInstanceName
 from XenKvmLib.enumclass import CIM_Instance
 from CimTest import Globals
+from XenKvmLib.cim_conn import get_conn
 
 class CIM_MyClass(CIM_Instance):
     def __init__(self, server, **key):
-        conn = pywbem.WBEMConnection('http://%s' % server,
-                                     (Globals.CIM_USER, Globals.CIM_PASS),
-                                     Globals.CIM_NS)
+        conn = get_conn(server)
 
         try:
             classname = self.__class__.__name__
@@ -54,9 +53,7 @@ class LXC_ResourcePoolConfigurationService(CIM_ResourcePoolConfigurationService)
     pass
 
 def enumerate(server, classname):
-    conn = pywbem.WBEMConnection('http://%s' % server,
-                                 (Globals.CIM_USER, Globals.CIM_PASS),
-                                 Globals.CIM_NS)
+    conn = get_conn(server)
    
     cn = eval(classname)
 
@@ -25,6 +25,7 @@
 import pywbem
 from CimTest.CimExt import CIMMethodClass, CIMClassMOF
 from CimTest import Globals
+from XenKvmLib.cim_conn import get_conn
 
 class CIM_ResourcePoolConfigurationService(CIMMethodClass):
     conn = None
@@ -32,9 +33,7 @@ class CIM_ResourcePoolConfigurationService(CIMMethodClass):
 
     def __init__(self, server):
         
-        self.conn = pywbem.WBEMConnection('http://%s' % server,
-                                          (Globals.CIM_USER, Globals.CIM_PASS),
-                                          Globals.CIM_NS)
+        self.conn = get_conn(server)
         
         self.inst = self.__class__.__name__
 
@@ -0,0 +1,88 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# Waiting for a guest to reach a state.
+#
+# wait_for() re-runs a check until it passes or the deadline expires.
+# Between checks it sleeps with exponential backoff, starting at
+# CIM_WAIT_INITIAL seconds and capped at CIM_WAIT_MAX_DELAY seconds.  When
+# libvirt lifecycle events are available for the guest, an event for it
+# ends the sleep early so the change is noticed right away.  Every wait is
+# recorded in wait_stats.  The checks bypass the CimTest.Cache read cache.
+
+import os
+from time import time, sleep
+from CimTest.Globals import logger
+from CimTest import Cache
+from XenKvmLib import virt_backend
+
+initial_delay = float(os.getenv('CIM_WAIT_INITIAL', '0.1'))
+max_delay = float(os.getenv('CIM_WAIT_MAX_DELAY', '2'))
+
+# (description, seconds waited, number of checks, passed)
+wait_stats = []
+
+def wait_for(check, timeout, server=None, uri=None, dom_name=None,
+             desc="guest state"):
+    '''Call @check until it returns True or @timeout seconds have passed.
+    If @dom_name is given, lifecycle events for that guest on @server and
+    libvirt @uri wake up the wait early.  Return True if @check passed.'''
+
+    start_time = time()
+    deadline = start_time + timeout
+    delay = initial_delay
+    checks = 0
+    passed = False
+
+    waiter = None
+    if dom_name is not None:
+        waiter = virt_backend.add_domain_waiter(server, uri, dom_name)
+
+    try:
+        while True:
+            if waiter is not None:
+                waiter.clear()
+
+            checks += 1
+            Cache.suspend()
+            try:
+                passed = check()
+            finally:
+                Cache.resume()
+            if passed:
+                break
+
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+
+            if waiter is not None:
+                waiter.wait(min(delay, remaining))
+            else:
+                sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+    finally:
+        if waiter is not None:
+            virt_backend.remove_domain_waiter(server, uri, dom_name, waiter)
+
+    elapsed = time() - start_time
+    wait_stats.append((desc, elapsed, checks, passed))
+    logger.info("Waited %.3f seconds (%d checks) for %s", elapsed, checks,
+                desc)
+
+    return passed
@@ -23,9 +23,12 @@
 #
 import tempfile
 import os
+from time import time
 from VirtLib import utils
 from XenKvmLib.xm_virt_util import domain_list, virt2uri
-from CimTest.Globals import CIM_FUUID
+from XenKvmLib import virt_backend
+from CimTest.Globals import CIM_FUUID, logger
+from CimTest import Cache
 
 try:
     import uuid as _uuid
@@ -49,24 +52,31 @@ def define_test_domain(xml, server, virt="Xen"):
 
     cmd = "virsh -c %s define %s 2>/dev/null" % (virt2uri(virt), name)
     s, o = utils.run_remote(server, cmd)
+    Cache.invalidate()
 
     return s == 0
 
 def undefine_test_domain(name, server, virt="Xen"):
     cmd = "virsh -c %s undefine %s 2>/dev/null" % (virt2uri(virt), name)
     s, o = utils.run_remote(server, cmd)
+    Cache.invalidate()
 
     return s == 0
 
 def start_test_domain(name, server, virt="Xen"):
     cmd = "virsh -c %s start %s 2>/dev/null" % (virt2uri(virt), name)
     s, o = utils.run_remote(server, cmd)
+    Cache.invalidate()
 
     return s == 0
 
 def virdomid_list(server, virt="Xen"):
     """Get a list of domid from virsh"""
     
+    ids = virt_backend.domain_ids(server, virt2uri(virt))
+    if ids is not None:
+        return ids
+
     cmd = 'virsh -c %s list 2>/dev/null | sed "1,2 d; /^$/d"' % \
                 virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
@@ -94,20 +104,33 @@ def set_uuid(myuuid=0):
 
     return myuuid
 
-def get_uuid_list():
-    """Get a list of uuid from CIM_FUUID"""
+def read_uuid_list(fuuid=CIM_FUUID):
+    """Get a list of uuid from fuuid, leaving the file in place"""
     try:
-        f = file(CIM_FUUID, 'r')
+        f = file(fuuid, 'r')
         mylist = [x.rstrip('\n') for x in f.readlines()]
         f.close()
-        os.unlink(CIM_FUUID)
     except Exception, detail:
         mylist = []
 
     return mylist
 
+def get_uuid_list():
+    """Get a list of uuid from CIM_FUUID"""
+    mylist = read_uuid_list()
+    try:
+        os.unlink(CIM_FUUID)
+    except Exception, detail:
+        pass
+
+    return mylist
+
 def viruuid(name, server, virt="Xen"):
     """Return domain uuid given domid or domname"""
+    uuid = virt_backend.domain_uuid(server, virt2uri(virt), name)
+    if uuid is not None:
+        return uuid or 0
+
     cmd = 'virsh -c %s domuuid %s 2>/dev/null | sed "/^$/d"' % \
                 (virt2uri(virt), name)
     ret, out = utils.run_remote(server, cmd)
@@ -122,19 +145,69 @@ def destroy_and_undefine_domain(name, server, virt="Xen"):
     cmd = 'virsh -c %s "destroy %s ; undefine %s" 2>/dev/null' % \
                 (virt2uri(virt), name, name)
     utils.run_remote(server, cmd)
+    Cache.invalidate()
+
+def domain_uuids(server, virt="Xen"):
+    """Return a {name: uuid} dict of all domains, using a single remote
+    query"""
+    uuids = virt_backend.domain_uuids(server, virt2uri(virt))
+    if uuids is not None:
+        return uuids
+
+    uuids = {}
+    cmd = 'virsh -c %s list --all 2>/dev/null | sed "1,2 d; /^$/d" | ' \
+          'while read id name rest; do ' \
+          'echo "$name $(virsh -c %s domuuid $name 2>/dev/null)"; done' % \
+          (virt2uri(virt), virt2uri(virt))
+    ret, out = utils.run_remote(server, cmd)
+    if ret != 0:
+        return uuids
+
+    for line in out.split("\n"):
+        dinfo = line.split()
+        if len(dinfo) == 2:
+            uuids[dinfo[0]] = dinfo[1]
+
+    return uuids
+
+def destroy_and_undefine_list(names, server, virt="Xen"):
+    """Destroy and undefine the domains in names with a single virsh
+    invocation"""
+    if len(names) == 0:
+        return
+
+    if not virt_backend.destroy_and_undefine(server, virt2uri(virt), names):
+        virsh_cmds = ["destroy %s ; undefine %s" % (name, name)
+                      for name in names]
+        cmd = 'virsh -c %s "%s" 2>/dev/null' % (virt2uri(virt),
+                                                 " ; ".join(virsh_cmds))
+        utils.run_remote(server, cmd)
+
+    Cache.invalidate()
 
 def destroy_and_undefine_all(server, virt="Xen", aggressive = False):
     """Destroy and undefine all domain to keep a 
     clean env for next testcase"""
     
-    names = domain_list(server, virt)
-    ids = virdomid_list(server, virt)
-    names.extend(ids)
+    start_time = time()
     uuid_list = get_uuid_list()
 
-    for name in names:
-        if aggressive or viruuid(name, server, virt) in uuid_list:
-            destroy_and_undefine_domain(name, server, virt)
+    # Nothing was recorded in CIM_FUUID, so there is nothing to clean up
+    if not aggressive and len(uuid_list) == 0:
+        return
+
+    uuids = domain_uuids(server, virt)
+    names = []
+    for name, uuid in uuids.items():
+        if name == "Domain-0":
+            continue
+        if aggressive or uuid in uuid_list:
+            names.append(name)
+
+    destroy_and_undefine_list(names, server, virt)
+
+    logger.info("Removed %d of %d guests in %.3f seconds", len(names),
+                len(uuids), time() - start_time)
 
 
 # The following are the inputs to the function:
@@ -156,6 +229,7 @@ def test_domain_function(xmlfile_domname, server, cmd, virt="Xen"):
 
     vcmd = "virsh -c %s %s %s 2>/dev/null" % (virt2uri(virt), cmd, name)
     s, o = utils.run_remote(server, vcmd)
+    Cache.invalidate()
     if cmd == "define" or cmd == "create":
         f.close()
     return s == 0
@@ -182,6 +256,7 @@ def create_vnet(server, net_xml, virt="Xen"):
     fname = nf.name
     cmd = "virsh -c %s net-create %s 2>/dev/null" % (virt2uri(virt), fname)
     ret, out = utils.run_remote(server, cmd)
+    Cache.invalidate()
     nf.close()
     if ret != 0:
         return -1
@@ -0,0 +1,337 @@
+#
+# Copyright 2026 IBM Corp.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307  USA
+#
+
+# libvirt-python backend for the virsh based helpers in xm_virt_util and
+# test_doms.
+#
+# Each query returns None when the backend can't answer it (libvirt-python
+# missing, connection failure, unexpected libvirt error) so that the caller
+# falls back to running virsh.  Set CIM_VIRT_BACKEND=virsh to always use
+# virsh.
+
+import os
+import threading
+from VirtLib.utils import localhost, SSH_KEY
+from CimTest.Globals import logger
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+backend = os.getenv('CIM_VIRT_BACKEND', 'libvirt')
+
+_conns = {}
+_conns_lock = threading.Lock()
+_conns_pid = os.getpid()
+
+# Domain lifecycle events, see add_domain_waiter().  Set CIM_VIRT_EVENTS=0
+# to disable them.
+events = os.getenv('CIM_VIRT_EVENTS', '1') != '0'
+_event_loop_pid = None
+_event_conns = set()
+_waiters = {}
+
+def _ignore_error(ctx, err):
+    pass
+
+if libvirt is not None:
+    libvirt.registerErrorHandler(_ignore_error, None)
+
+def remote_uri(server, uri):
+    '''Turn a local libvirt @uri into its ssh equivalent for @server.'''
+
+    if server in localhost:
+        return uri
+
+    driver, path = uri.split(':///', 1)
+    return '%s+ssh://root@%s/%s?keyfile=%s&no_verify=1' % (driver, server,
+                                                          path, SSH_KEY)
+
+def get_conn(server, uri):
+    '''Return a cached libvirt connection to @uri on @server, or None.'''
+
+    global _conns_pid
+
+    if libvirt is None or backend != 'libvirt' or not uri:
+        return None
+
+    key = (server, uri)
+
+    _conns_lock.acquire()
+    try:
+        # Connections must not be shared with a forked child
+        if _conns_pid != os.getpid():
+            _conns.clear()
+            _event_conns.clear()
+            _waiters.clear()
+            _conns_pid = os.getpid()
+
+        conn = _conns.get(key)
+        if conn is not None:
+            try:
+                if conn.isAlive():
+                    return conn
+            except (AttributeError, libvirt.libvirtError):
+                return conn
+
+        if key in _conns and conn is None:
+            return None
+
+        # The event implementation has to be in place before the first
+        # connection is opened.
+        _start_event_loop()
+
+        try:
+            conn = libvirt.open(remote_uri(server, uri))
+        except libvirt.libvirtError, details:
+            logger.error("Unable to open libvirt connection to %s on %s: "
+                         "%s", uri, server, details)
+            conn = None
+
+        _conns[key] = conn
+        return conn
+    finally:
+        _conns_lock.release()
+
+def _run_event_loop():
+    while True:
+        libvirt.virEventRunDefaultImpl()
+
+def _start_event_loop():
+    global _event_loop_pid
+
+    if not events or _event_loop_pid is not None:
+        return
+
+    try:
+        libvirt.virEventRegisterDefaultImpl()
+    except (AttributeError, libvirt.libvirtError):
+        return
+
+    t = threading.Thread(target=_run_event_loop)
+    t.setDaemon(True)
+    t.start()
+    _event_loop_pid = os.getpid()
+
+def _lifecycle_event(conn, dom, event, detail, key):
+    _conns_lock.acquire()
+    try:
+        waiters = list(_waiters.get((key, dom.name()), []))
+    finally:
+        _conns_lock.release()
+
+    for waiter in waiters:
+        waiter.set()
+
+def add_domain_waiter(server, uri, name):
+    '''Return a threading.Event that is set whenever a lifecycle event
+    is received for the domain @name, or None if events are not
+    available.  Release it with remove_domain_waiter().'''
+
+    conn = get_conn(server, uri)
+    if conn is None or _event_loop_pid != os.getpid():
+        return None
+
+    key = (server, uri)
+
+    _conns_lock.acquire()
+    try:
+        if key not in _event_conns:
+            try:
+                conn.domainEventRegisterAny(None,
+                                    libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+                                    _lifecycle_event, key)
+            except (AttributeError, libvirt.libvirtError):
+                return None
+            _event_conns.add(key)
+
+        waiter = threading.Event()
+        _waiters.setdefault((key, name), []).append(waiter)
+        return waiter
+    finally:
+        _conns_lock.release()
+
+def remove_domain_waiter(server, uri, name, waiter):
+    _conns_lock.acquire()
+    try:
+        waiters = _waiters.get(((server, uri), name), [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+    finally:
+        _conns_lock.release()
+
+def _all_domains(conn):
+    '''Return (id, name) for all domains: running domains ordered by id
+    followed by inactive domains ordered by name, the same order as
+    virsh list --all.'''
+
+    active = []
+    inactive = []
+
+    if hasattr(conn, 'listAllDomains'):
+        # One call per state: isActive() would be a round trip per domain,
+        # while ID() and name() are answered locally
+        flags = libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE
+        for dom in conn.listAllDomains(flags):
+            active.append((dom.ID(), dom.name()))
+        flags = libvirt.VIR_CONNECT_LIST_DOMAINS_INACTIVE
+        for dom in conn.listAllDomains(flags):
+            inactive.append((-1, dom.name()))
+    else:
+        for dom_id in conn.listDomainsID():
+            active.append((dom_id, conn.lookupByID(dom_id).name()))
+        for name in conn.listDefinedDomains():
+            inactive.append((-1, name))
+
+    active.sort()
+    inactive.sort()
+    return active + inactive
+
+def domain_names(server, uri, active_only=False):
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        doms = _all_domains(conn)
+    except libvirt.libvirtError:
+        return None
+
+    return [name for dom_id, name in doms if not active_only or dom_id >= 0]
+
+def domain_ids(server, uri):
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        ids = conn.listDomainsID()
+    except libvirt.libvirtError:
+        return None
+
+    ids.sort()
+    return [str(dom_id) for dom_id in ids]
+
+def domain_uuid(server, uri, name):
+    '''Return the UUID of the domain with the name or id @name, '' if
+    there is no such domain.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        try:
+            dom = conn.lookupByName(str(name))
+        except libvirt.libvirtError, details:
+            if details.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN or \
+               not str(name).isdigit():
+                raise
+            dom = conn.lookupByID(int(name))
+        return dom.UUIDString()
+    except libvirt.libvirtError, details:
+        if details.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+            return ''
+        return None
+
+def network_names(server, uri):
+    '''Return the names of the active networks.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        return conn.listNetworks()
+    except libvirt.libvirtError:
+        return None
+
+def network_bridge(server, uri, network):
+    '''Return the bridge of @network, '' if there is no such network.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        return conn.networkLookupByName(network).bridgeName()
+    except libvirt.libvirtError, details:
+        if details.get_error_code() == libvirt.VIR_ERR_NO_NETWORK:
+            return ''
+        return None
+
+def pool_names(server, uri):
+    '''Return the names of the active storage pools.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        return conn.listStoragePools()
+    except libvirt.libvirtError:
+        return None
+
+def domain_uuids(server, uri):
+    '''Return a {name: uuid} dict for all domains.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    uuids = {}
+    try:
+        if hasattr(conn, 'listAllDomains'):
+            for dom in conn.listAllDomains(0):
+                uuids[dom.name()] = dom.UUIDString()
+        else:
+            for dom_id in conn.listDomainsID():
+                dom = conn.lookupByID(dom_id)
+                uuids[dom.name()] = dom.UUIDString()
+            for name in conn.listDefinedDomains():
+                uuids[name] = conn.lookupByName(name).UUIDString()
+    except libvirt.libvirtError:
+        return None
+
+    return uuids
+
+def destroy_and_undefine(server, uri, names):
+    '''Destroy and undefine the domains in @names.  Return None if any of
+    them could not be removed.'''
+
+    conn = get_conn(server, uri)
+    if conn is None:
+        return None
+
+    try:
+        for name in names:
+            try:
+                dom = conn.lookupByName(name)
+            except libvirt.libvirtError, details:
+                if details.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    continue
+                raise
+            if dom.isActive():
+                dom.destroy()
+            if dom.isPersistent():
+                dom.undefine()
+    except libvirt.libvirtError:
+        return None
+
+    return True
@@ -25,16 +25,16 @@ import random
 from time import sleep
 from  socket import gethostbyaddr
 from VirtLib import utils
-from pywbem import WBEMConnection, CIMInstanceName
+from pywbem import CIMInstanceName
 from CimTest.CimExt import CIMMethodClass, CIMClassMOF
 from CimTest.ReturnCodes import PASS, FAIL, SKIP
 from XenKvmLib.enumclass import EnumInstances
 from XenKvmLib.classes import get_typed_class, virt_types
 from XenKvmLib.xm_virt_util import domain_list, net_list, active_domain_list
 from XenKvmLib.const import get_provider_version, default_network_name
-from CimTest.Globals import logger, CIM_USER, CIM_PASS, CIM_NS, \
-                            CIM_ERROR_ENUMERATE
+from CimTest.Globals import logger, CIM_ERROR_ENUMERATE
 from XenKvmLib.common_util import destroy_netpool
+from XenKvmLib.cim_conn import get_conn
 
 # Migration constants
 CIM_MIGRATE_OFFLINE=1
@@ -62,8 +62,7 @@ class CIM_VirtualSystemMigrationService(CIMMethodClass):
     inst = None
 
     def __init__(self, server, virt='Xen'):
-        self.conn = WBEMConnection('http://%s' % server,
-                                  (CIM_USER, CIM_PASS), CIM_NS)
+        self.conn = get_conn(server)
 
         self.inst = get_typed_class(virt, 'VirtualSystemMigrationService')
 
@@ -26,6 +26,7 @@ import pywbem
 from CimTest.CimExt import CIMMethodClass, CIMClassMOF
 from CimTest import Globals
 from XenKvmLib import const
+from XenKvmLib.cim_conn import get_conn
 from XenKvmLib.classes import get_typed_class, get_class_type, virt_types
 
 RASD_TYPE_PROC = 3
@@ -60,9 +61,7 @@ class CIM_VirtualSystemManagementService(CIMMethodClass):
 
     def __init__(self, server):
         
-        self.conn = pywbem.WBEMConnection('http://%s' % server,
-                                          (Globals.CIM_USER, Globals.CIM_PASS),
-                                          Globals.CIM_NS)
+        self.conn = get_conn(server)
         
         self.inst = self.__class__.__name__
 
@@ -81,9 +80,7 @@ def get_vsms_class(virt):
     pass
 
 def enumerate_instances(server, virt='Xen'):
-    conn = pywbem.WBEMConnection('http://%s' % server,
-                                 (Globals.CIM_USER, Globals.CIM_PASS),
-                                 Globals.CIM_NS)
+    conn = get_conn(server)
 
     cn = get_typed_class(virt, 'VirtualSystemManagementService')
     try:
@@ -30,35 +30,52 @@
 # The VirtXML should not be used directly, it only defines common XML nodes 
 # shared by XenXML & KVMXML.
 import os
+import re
 import sys
+import copy
 import random
+import threading
 import platform
 import tempfile
 import pywbem
 
 from lxml import etree
-from time import sleep
+from time import sleep, time
 
 from VirtLib import utils, live
 from XenKvmLib.xm_virt_util import get_bridge_from_network_xml, bootloader, \
-                                   net_list, host_cpu_model
-from XenKvmLib.test_doms import set_uuid, viruuid
+                                   net_list, host_cpu_model, virt2uri
+from XenKvmLib.test_doms import set_uuid, viruuid, uuid
 from XenKvmLib import vsms
 from XenKvmLib import const
 from CimTest.Globals import logger, CIM_IP, CIM_PORT, CIM_NS, CIM_USER, CIM_PASS
+from CimTest import Cache
 from CimTest.ReturnCodes import SKIP, PASS, FAIL
 from XenKvmLib.classes import virt_types, get_typed_class
 from XenKvmLib.enumclass  import GetInstance
 from XenKvmLib.const import get_provider_version
+from XenKvmLib.state_wait import wait_for
+from XenKvmLib.cim_conn import pool_size, run_concurrent
 
 vsms_graphics_sup = 763
 vsms_inputdev_sup = 771
 vsms_controller_sup = 1310
 
 
-class XMLClass:
-    xml_string = ""
+# Compiled XPath expressions, shared by all XMLClass instances
+_xpath_cache = {}
+
+def compiled_xpath(expr):
+    xpath = _xpath_cache.get(expr)
+    if xpath is None:
+        xpath = etree.XPath(expr)
+        _xpath_cache[expr] = xpath
+    return xpath
+
+class XMLClass(object):
     xdoc = None
+    _xml_string = ""
+    _dirty = False
 
     def __init__(self):
         self.refresh()
@@ -66,15 +83,28 @@ class XMLClass:
     def __str__(self):
         return self.xml_string
 
+    def _get_xml_string(self):
+        # Serialize xdoc only when the string is read after a change
+        if self._dirty:
+            self._xml_string = etree.tostring(self.xdoc)
+            self._dirty = False
+        return self._xml_string
+
+    def _set_xml_string(self, xml_string):
+        self._xml_string = xml_string
+        self._dirty = False
+
+    xml_string = property(_get_xml_string, _set_xml_string)
+
     def refresh(self):
         if self.xdoc is not None:
-            self.xml_string = etree.tostring(self.xdoc)
+            self._dirty = True
 
     def get_node(self, ixpath):
         if self.xdoc is None:
             return None
 
-        node_list = self.xdoc.xpath(ixpath)
+        node_list = compiled_xpath(ixpath)(self.xdoc)
         if len(node_list) != 1:
             raise LookupError('Zero or multiple nodes found for XPath' + ixpath)
         return node_list[0]
@@ -181,6 +211,9 @@ class Virsh:
 
         cmd = 'virsh -c %s %s %s 2>/dev/null' % (self.vuri, vcmd, name)
         s, o = utils.run_remote(ip, cmd)
+
+        # Every command run here changes guests, networks or pools
+        Cache.invalidate()
         if vcmd == 'define' or vcmd == 'create' or vcmd == 'net-create' \
            or vcmd == 'pool-create':
             # don't wait till gc does the ntf.close()
@@ -596,6 +629,81 @@ class VirtXML(Virsh, XMLClass):
             sys.exit(1)
 
 
+def guest_mac(mac, index):
+    '''Return a MAC for the @index'th guest of a batch, derived from @mac.
+    The fifth octet is left to const.worker_mac().'''
+
+    octets = mac.split(':')
+    octets[3] = '%02x' % ((index >> 8) & 0xff)
+    octets[5] = '%02x' % (index & 0xff)
+    return ':'.join(octets)
+
+def _run_pool(func, items, jobs):
+    '''Call @func on each of @items from at most @jobs threads.  @func
+    returns a CIM return code, 0 on success.  Return a list of
+    (item, seconds, rc) in the order of @items.'''
+
+    def timed(item):
+        start_time = time()
+        try:
+            rc = func(item)
+        except Exception, details:
+            logger.error("Got error %s with exception %s", details,
+                         details.__class__.__name__)
+            rc = None
+        return item, time() - start_time, rc
+
+    return [result for result, error in run_concurrent(timed, items, jobs)]
+
+class GuestBatch:
+    '''Guests defined by VirtCIM.define_many().
+
+    self.stats[op] holds (guest name, seconds, rc) for each guest and each
+    operation ('define', 'start', 'destroy').  rc is 0 on success, the
+    CIM error code when the provider returned one and None otherwise.'''
+
+    def __init__(self, guests, jobs):
+        self.guests = guests
+        self.jobs = jobs
+        self.stats = {}
+
+    def names(self):
+        return [guest.domain_name for guest in self.guests]
+
+    def failed(self, op):
+        return [name for name, secs, rc in self.stats.get(op, []) if rc != 0]
+
+    def run(self, op, func):
+        '''Run @func on all guests; return True if it passed for all.'''
+
+        results = _run_pool(func, self.guests, self.jobs)
+        self.stats[op] = [(guest.domain_name, secs, rc)
+                          for guest, secs, rc in results]
+
+        failed = self.failed(op)
+        if len(failed) > 0:
+            logger.error("%s failed for %d of %d guests", op, len(failed),
+                         len(self.guests))
+            return False
+
+        return True
+
+    def start(self, server, poll_time=30):
+        def start_guest(guest):
+            if guest.cim_start(server, poll_time=poll_time) == PASS:
+                return 0
+            return guest.err_rc
+
+        return self.run('start', start_guest)
+
+    def destroy(self, server):
+        def destroy_guest(guest):
+            if guest.cim_destroy(server):
+                return 0
+            return guest.err_rc
+
+        return self.run('destroy', destroy_guest)
+
 class VirtCIM:
     def __init__(self, virt, dom_name, uuid, pae, acpi, apic, disk_dev, 
                  disk_source, net_type, net_name, net_mac, vcpus, mem,
@@ -642,11 +750,8 @@ class VirtCIM:
 
         self.res_settings = []
 
-    def cim_define(self, ip, ref_conf=None):
-        service = vsms.get_vsms_class(self.virt)(ip)
-        sys_settings = str(self.vssd)
-
-        res_settings = self.res_settings
+    def rasd_settings(self, ip):
+        res_settings = []
         if self.dasd is not None:
             res_settings.append(str(self.dasd))
         if self.pasd is not None:
@@ -673,6 +778,14 @@ class VirtCIM:
            self.virt == 'KVM':
             res_settings.append(str(self.ctlasd))
 
+        return res_settings
+
+    def cim_define(self, ip, ref_conf=None):
+        service = vsms.get_vsms_class(self.virt)(ip)
+        sys_settings = str(self.vssd)
+
+        res_settings = self.res_settings + self.rasd_settings(ip)
+
         if ref_conf is None:
              ref_conf = ' '
 
@@ -694,6 +807,73 @@ class VirtCIM:
         set_uuid(viruuid(self.domain_name, ip, self.virt))
         return True
 
+    def define_many(self, ip, n, prefix=None, jobs=pool_size):
+        '''Define @n guests modelled on this one, named <prefix>-<index>
+        (prefix defaults to this guest's name), each with its own UUID
+        and MAC.  The MOF strings are built once and DefineSystem is
+        called from at most @jobs threads.  Return a GuestBatch.'''
+
+        if prefix is None:
+            prefix = self.domain_name
+
+        service = vsms.get_vsms_class(self.virt)(ip)
+        sys_settings = str(self.vssd)
+        res_settings = self.res_settings + self.rasd_settings(ip)
+        mac = getattr(self.nasd, 'Address', None)
+
+        name_re = re.compile(r'(?<=["/:])%s(?=["/])' % 
+                             re.escape(self.domain_name))
+        uuid_re = re.compile(r'UUID = "[^"]*";')
+
+        guests = []
+        for i in range(0, n):
+            guest = copy.copy(self)
+            guest.domain_name = "%s-%d" % (prefix, i)
+            guest.err_rc = None
+            guest.err_desc = None
+            guest.uuid = uuid()
+
+            def fill(mof):
+                mof = name_re.sub(guest.domain_name, mof)
+                if mac is not None:
+                    mof = mof.replace(mac, guest_mac(mac, i))
+                return mof
+
+            uuid_prop = 'UUID = "%s";' % guest.uuid
+            vssd = fill(sys_settings)
+            if uuid_re.search(vssd):
+                vssd = uuid_re.sub(uuid_prop, vssd)
+            else:
+                vssd = vssd.replace("{\n", "{\n%s\n" % uuid_prop, 1)
+
+            guest.vssd = vssd
+            guest.res_settings = [fill(rasd) for rasd in res_settings]
+            guests.append(guest)
+
+        uuid_lock = threading.Lock()
+
+        def define_guest(guest):
+            try:
+                service.DefineSystem(SystemSettings=guest.vssd,
+                                     ResourceSettings=guest.res_settings,
+                                     ReferenceConfiguration=' ')
+            except pywbem.CIMError, (rc, desc):
+                logger.error('Got CIM error %s with return code %s', desc, rc)
+                guest.err_rc = rc
+                guest.err_desc = desc
+                return rc
+
+            uuid_lock.acquire()
+            try:
+                set_uuid(guest.uuid)
+            finally:
+                uuid_lock.release()
+            return 0
+
+        batch = GuestBatch(guests, jobs)
+        batch.run('define', define_guest)
+        return batch
+
     def cim_destroy(self, ip):
         service = vsms.get_vsms_class(self.virt)(ip)
         cs_cn = get_typed_class(self.virt, 'ComputerSystem')
@@ -771,12 +951,16 @@ class VirtCIM:
             logger.error("Exception: %s", detail)
             return FAIL 
 
-        for i in range(1, (poll_time + 1)):
-            status = self.check_guest_state(server, en_state, req_state)
-            if status == PASS:
-                break
+        def check():
+            return self.check_guest_state(server, en_state, req_state) == PASS
+
+        # poll_time is the number of seconds to wait for the new state
+        if wait_for(check, poll_time, server, virt2uri(self.virt),
+                    self.domain_name,
+                    "%s to reach state %s" % (self.domain_name, en_state)):
+            return PASS
 
-        return status
+        return FAIL
 
     def cim_start(self, server, req_time=const.TIME, poll_time=30): 
         return self.cim_state_change(server, const.CIM_ENABLE, 
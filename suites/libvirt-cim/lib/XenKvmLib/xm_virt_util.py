@@ -25,8 +25,11 @@
 import os
 import re
 from VirtLib import utils
+from CimTest import Cache
 import socket
 from VirtLib.live import fv_cap
+from XenKvmLib.host_facts import host_fact
+from XenKvmLib import virt_backend
 
 CONSOLE_APP_PATH = "/tmp/Console.py"
 def xm_domname(ip, domid):
@@ -100,6 +103,7 @@ def destroy_domain(server, dom, virt="Xen"):
 
     cmd = "virsh -c %s destroy %s 2>/dev/null" %  (virt2uri(virt), dom)
     ret, out = utils.run_remote(server, cmd)
+    Cache.invalidate()
     print cmd, ret, out
 
     return ret 
@@ -109,6 +113,10 @@ def domain_list(server, virt="Xen"):
     if virt == "XenFV":
        virt = "Xen"
 
+    names = virt_backend.domain_names(server, virt2uri(virt))
+    if names is not None:
+        return names
+
     cmd = 'virsh -c %s list --all 2>/dev/null | sed -e "1,2 d" -e "$ d"' % \
                 virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
@@ -129,6 +137,10 @@ def active_domain_list(server, virt="Xen"):
     if virt == "XenFV":
         virt = "Xen"
 
+    names = virt_backend.domain_names(server, virt2uri(virt), True)
+    if names is not None:
+        return names
+
     cmd = 'virsh -c %s list 2>/dev/null | sed -e "1,2 d" -e "$ d"' % \
                 virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
@@ -144,6 +156,7 @@ def active_domain_list(server, virt="Xen"):
 
     return names
 
+@host_fact('server')
 def bootloader(server, gtype = 0):
     """
        Function to find the bootloader to be used.
@@ -175,6 +188,10 @@ def bootloader(server, gtype = 0):
 
 def net_list(server, virt="Xen"):
     """Function to list active network"""
+    names = virt_backend.network_names(server, virt2uri(virt))
+    if names is not None:
+        return names
+
     names = []
     cmd = 'virsh -c %s net-list 2>/dev/null | sed -e "1,2 d" -e "$ d"' % \
                 virt2uri(virt)
@@ -193,6 +210,10 @@ def net_list(server, virt="Xen"):
 def get_bridge_from_network_xml(network, server, virt="Xen"):
     """Function returns bridge name for a given virtual network"""
 
+    bridge = virt_backend.network_bridge(server, virt2uri(virt), network)
+    if bridge is not None:
+        return bridge or None
+
     cmd = 'virsh -c %s net-dumpxml %s 2>/dev/null | \
            awk "/bridge name/ { print $2 }"' % (virt2uri(virt), network)
     ret, out = utils.run_remote(server, cmd)
@@ -208,6 +229,7 @@ def net_destroy(network, server, virt="Xen"):
 
     cmd = "virsh -c %s net-destroy %s 2>/dev/null" % (virt2uri(virt), network)
     ret, out = utils.run_remote(server, cmd)
+    Cache.invalidate()
 
     return ret 
 
@@ -229,6 +251,7 @@ def virsh_version_cmp(version1, version2):
         return [int(x) for x in re.sub(r'(\.0+)*$','', v).split(".")]
     return cmp(normalize(version1), normalize(version2))
 
+@host_fact('server', 'virt')
 def virsh_version(server, virt="KVM"):
     cmd = "virsh -c %s -v 2>/dev/null" % virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
@@ -238,6 +261,10 @@ def virsh_version(server, virt="KVM"):
 
 def diskpool_list(server, virt="KVM"):
     """Function to list active DiskPool list"""
+    names = virt_backend.pool_names(server, virt2uri(virt))
+    if names is not None:
+        return names
+
     names = []
     cmd = 'virsh -c %s pool-list 2>/dev/null | sed -e "1,2 d" -e "$ d"' % \
            virt2uri(virt)
@@ -271,6 +298,7 @@ def vol_delete(server, virt="KVM", vol_name=None, pool_name=None):
     cmd = "virsh -c %s vol-delete %s --pool %s 2>/dev/null" \
             % (virt2uri(virt), vol_name, pool_name)
     ret, out = utils.run_remote(server, cmd)
+    Cache.invalidate()
     if ret != 0:
         return None
 
@@ -285,6 +313,7 @@ def virsh_vcpuinfo(server, dom, virt="Xen"):
         return vcpu
     return None
 
+@host_fact('server', 'virt')
 def get_hv_ver(server, virt="Xen"):
     cmd = "virsh -c %s version 2>/dev/null"  %virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
@@ -417,6 +446,7 @@ def network_macs(ip, vs_name):
 
     return ret
 
+@host_fact('server', 'virt')
 def host_cpu_model(server, virt="KVM"):
     cmd = "virsh -c %s nodeinfo 2>/dev/null | grep 'CPU model'" % virt2uri(virt)
     ret, out = utils.run_remote(server, cmd)
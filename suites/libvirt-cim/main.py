@@ -23,23 +23,34 @@
 #
 
 from time import time
-from time import sleep
 from optparse import OptionParser
+from subprocess import Popen, PIPE, STDOUT
 import os
 import sys
+import threading
 sys.path.append('../../lib')
 import TestSuite
+from TestExecutor import TestExecutor
 from CimTest.Globals import logger, log_param
+from CimTest import Stats
 from CimTest.ReturnCodes import PASS, FAIL, XFAIL, SKIP
 import commands
 from VirtLib import groups
 import ConfigParser
 sys.path.append('./lib')
 from XenKvmLib.const import platform_sup, default_network_name, \
-                            default_pool_name
+                            default_pool_name, get_provider_version
 from XenKvmLib.reporting import gen_report, send_report 
+from XenKvmLib import history
 from VirtLib import utils
-from XenKvmLib.xm_virt_util import virt2uri
+from XenKvmLib.xm_virt_util import virt2uri, virsh_version, get_hv_ver, \
+                                  host_cpu_model, bootloader
+from XenKvmLib.host_facts import invalidate
+from XenKvmLib.cim_conn import get_conn
+from XenKvmLib.classes import get_typed_class
+from XenKvmLib.test_doms import read_uuid_list, domain_uuids
+from XenKvmLib.state_wait import wait_for
+from CimTest.Globals import CIM_FUUID
 from CimTest.ReturnCodes import PASS, FAIL
 from XenKvmLib.common_util import create_netpool_conf, destroy_netpool, \
                                   create_diskpool_conf, destroy_diskpool, \
@@ -72,10 +83,67 @@ parser.add_option("--print-exec-time", action="store_true",
                   help="Print execution time of each test")
 parser.add_option("--test_subset", dest="test_subset",
                   help="Only run specified dirs [dir,dir,...] or [dir:dir]")
+parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+                  help="Number of tests to run concurrently (default: 1)")
+parser.add_option("--pause", dest="pause", type="float", default=3,
+                  help="Maximum number of seconds to wait between tests for "
+                       "the CIMOM and libvirt to settle (default: 3)")
+parser.add_option("--in-process", action="store_true", dest="in_process",
+                  help="Run tests in a persistent Python process instead of "
+                       "starting a new interpreter for each test")
+parser.add_option("--profile-cim", action="store_true", dest="profile_cim",
+                  help="Print the slowest CIM operations and classes of "
+                       "the run")
+parser.add_option("--profile-remote", action="store_true",
+                  dest="profile_remote",
+                  help="Print the tests spending the most time in remote "
+                       "commands and the slowest commands of the run")
+parser.add_option("--read-cache", action="store_true", dest="read_cache",
+                  help="Let the tests cache the instances they enumerate "
+                       "and get until they invoke a method")
+parser.add_option("--enum-jobs", dest="enum_jobs", type="int", default=1,
+                  help="Number of device, pool and RASD classes the tests "
+                       "enumerate at the same time (default: 1)")
+parser.add_option("--history", dest="history",
+                  help="Record the run in this SQLite file and report the "
+                       "tests that ran slower than in previous runs")
+parser.add_option("--regress-threshold", dest="regress_threshold",
+                  type="int", default=history.REGRESS_THRESHOLD,
+                  help="Percent slowdown against the median of previous "
+                       "runs reported as a regression (default: %d)" %
+                       history.REGRESS_THRESHOLD)
+parser.add_option("--history-window", dest="history_window", type="int",
+                  default=history.HISTORY_WINDOW,
+                  help="Number of previous runs to compare with "
+                       "(default: %d)" % history.HISTORY_WINDOW)
+parser.add_option("--shard", dest="shard",
+                  help="Only run shard i of K shards: --shard=i/K.  The "
+                       "shards hold the same number of tests unless "
+                       "--shard-durations is given")
+parser.add_option("--shard-durations", dest="shard_durations",
+                  help="Balance the shards by the test times in this result "
+                       "file (.jsonl).  Every host must be given the same "
+                       "file")
+parser.add_option("--merge-results", dest="merge_results",
+                  help="Merge the result files of several runs (for "
+                       "example shards) into one report instead of running "
+                       "tests: --merge-results=file.jsonl,file.jsonl,...")
 
 TEST_SUITE = 'cimtest'
 CIMTEST_RCFILE = '%s/.cimtestrc' % os.environ['HOME']
 
+# Host facts shared with the tests, see XenKvmLib/host_facts.py
+FACTS_FILE = '/tmp/cimtest.%d.facts'
+
+# Per test counters written by the test, see CimTest/Stats.py
+STATS_FILE = '/tmp/cimtest.%d.%s.stats'
+
+# Each --jobs worker gets its own block of indication listener ports
+IND_PORT_RANGE = 100
+
+# Number of entries printed by --profile-cim and --profile-remote
+PROFILE_TOP = 10
+
 def set_python_path():
     previous_pypath = os.environ.get('PYTHONPATH')
 
@@ -96,7 +164,7 @@ def remove_old_logs(ogroup):
 
     for group in group_list:
         g_path = os.path.join(TEST_SUITE, group)
-        cmd = "cd %s && rm -f %s" % (g_path, "cimtest.log")
+        cmd = "cd %s && rm -f %s" % (g_path, "cimtest.log cimtest.*.log")
         status, output = commands.getstatusoutput(cmd)
 
     print "Cleaned log files."
@@ -154,6 +222,23 @@ def cleanup_env(ip, virt):
 
     return PASS
 
+def prime_host_facts(ip, virt):
+    os.environ['CIM_FACTS_FILE'] = FACTS_FILE % os.getpid()
+    invalidate(ip, virt)
+
+    get_provider_version(virt, ip)
+    virsh_version(ip, virt)
+    get_hv_ver(ip, virt)
+    host_cpu_model(ip, virt)
+    if virt == 'Xen' or virt == 'XenFV':
+        bootloader(ip, 0)
+        bootloader(ip, 1)
+
+def remove_host_facts():
+    facts_file = os.environ.get('CIM_FACTS_FILE')
+    if facts_file and os.path.exists(facts_file):
+        os.remove(facts_file)
+
 def print_exec_time(testsuite, exec_time, prefix=None):
 
     #Convert run time from seconds to hours
@@ -178,12 +263,400 @@ def print_exec_time(testsuite, exec_time, prefix=None):
     testsuite.debug("%s %sh | %smin | %ssec | %smsec" %
                     (prefix, h, m, s, msec)) 
 
+def print_cim_profile(testsuite):
+    ops = {}
+    classes = {}
+    for rec, output in testsuite.records:
+        for op in rec.get(Stats.CIM_OPS) or []:
+            key = (op['op'], op['class'])
+            total = ops.setdefault(key, [0, 0.0, 0.0, 0])
+            total[0] += op['calls']
+            total[1] += op['time']
+            total[2] = max(total[2], op['max_time'])
+            total[3] += op['errors']
+
+            total = classes.setdefault(op['class'], [0, 0.0])
+            total[0] += op['calls']
+            total[1] += op['time']
+
+    testsuite.debug("Slowest CIM operations (by longest call):")
+    testsuite.debug("  %-24s %-48s %7s %9s %9s %6s" %
+                    ("Operation", "Class", "Calls", "Max(s)", "Total(s)",
+                     "Errors"))
+    by_max = ops.items()
+    by_max.sort(key=lambda item: item[1][2], reverse=True)
+    for (op, cn), (calls, secs, max_secs, errors) in by_max[:PROFILE_TOP]:
+        testsuite.debug("  %-24s %-48s %7d %9.3f %9.3f %6d" %
+                        (op, cn, calls, max_secs, secs, errors))
+
+    testsuite.debug("Slowest CIM classes (by total time):")
+    testsuite.debug("  %-48s %7s %9s %9s" %
+                    ("Class", "Calls", "Total(s)", "Avg(s)"))
+    by_total = classes.items()
+    by_total.sort(key=lambda item: item[1][1], reverse=True)
+    for cn, (calls, secs) in by_total[:PROFILE_TOP]:
+        testsuite.debug("  %-48s %7d %9.3f %9.3f" %
+                        (cn, calls, secs, secs / calls))
+
+def print_remote_profile(testsuite):
+    tests = []
+    cmds = {}
+    for rec, output in testsuite.records:
+        if rec.get(Stats.REMOTE_TIME) is not None:
+            tests.append(rec)
+
+        for cmd in rec.get(Stats.REMOTE_OPS) or []:
+            key = (cmd['command'], cmd['host'])
+            total = cmds.setdefault(key, [0, 0.0, 0.0, 0, 0])
+            total[0] += cmd['calls']
+            total[1] += cmd['time']
+            total[2] = max(total[2], cmd['max_time'])
+            total[3] += cmd['failures']
+            total[4] += cmd['bytes']
+
+    testsuite.debug("Tests spending the most time in remote commands:")
+    testsuite.debug("  %-56s %9s %9s %9s %7s" %
+                    ("Test", "Time(s)", "Remote(s)", "CIM(s)", "Cmds"))
+    tests.sort(key=lambda rec: rec[Stats.REMOTE_TIME], reverse=True)
+    for rec in tests[:PROFILE_TOP]:
+        testsuite.debug("  %-56s %9.3f %9.3f %9.3f %7d" %
+                        ("%s - %s" % (rec['group'], rec['test']),
+                         rec['time'] or 0, rec[Stats.REMOTE_TIME],
+                         rec.get(Stats.CIM_TIME) or 0,
+                         rec.get(Stats.REMOTE_CMDS) or 0))
+
+    testsuite.debug("Slowest remote commands (by total time):")
+    testsuite.debug("  %-32s %-20s %7s %9s %9s %6s %10s" %
+                    ("Command", "Host", "Calls", "Max(s)", "Total(s)",
+                     "Failed", "Bytes"))
+    by_total = cmds.items()
+    by_total.sort(key=lambda item: item[1][1], reverse=True)
+    for (cmd, host), (calls, secs, max_secs, failed, nbytes) in \
+        by_total[:PROFILE_TOP]:
+        testsuite.debug("  %-32s %-20s %7d %9.3f %9.3f %6d %10d" %
+                        (cmd, host, calls, max_secs, secs, failed, nbytes))
+
+def get_worker_env(worker_id):
+    """Return the environment for tests run by a worker.  Worker 0 is
+       the serial runner and keeps the default guest namespace.
+    """
+    env = os.environ.copy()
+    if worker_id == 0:
+        return env
+
+    env['CIM_WORKER_ID'] = str(worker_id)
+    env['CIM_DOM_PREFIX'] = 'w%d_' % worker_id
+    env['CIM_IND_PORT_OFFSET'] = str(worker_id * IND_PORT_RANGE)
+
+    # destroy_and_undefine_all() only removes the guests recorded in
+    # CIM_FUUID, so a per-worker file keeps workers from cleaning up
+    # each other's guests.
+    env['CIM_FUUID'] = '/tmp/cimtest.%d.uuid' % worker_id
+
+    # Tests of the same group may run at the same time, so each worker
+    # logs to its own file, see merge_group_logs()
+    env['CIM_LOG_FILE'] = 'cimtest.%d.log' % worker_id
+
+    return env
+
+def merge_group_logs(test_list, jobs):
+    """Append the logs the workers wrote in each group directory to the
+       group's cimtest.log, one worker after the other.
+    """
+    group_list = set([test['group'] for test in test_list])
+    for group in group_list:
+        g_path = os.path.join(TEST_SUITE, group)
+        for worker_id in range(1, jobs + 1):
+            w_log = os.path.join(g_path, 'cimtest.%d.log' % worker_id)
+            if not os.path.exists(w_log):
+                continue
+
+            try:
+                src = open(w_log, 'r')
+                dst = open(os.path.join(g_path, 'cimtest.log'), 'a')
+                try:
+                    dst.write(src.read())
+                finally:
+                    src.close()
+                    dst.close()
+                os.remove(w_log)
+            except (IOError, OSError), details:
+                logger.error("Unable to merge %s: %s", w_log, details)
+
+def check_status(os_status):
+    # status should be from our test; however, if there's an OS level
+    # failure, it could be set to errno.  But that's included in our
+    # output, so just set it to FAIL; otherwise, we get a KeyError
+    # in Reporter.py when trying to index it's 'rc' record
+    if os_status not in (PASS, FAIL, XFAIL, SKIP):
+        logger.error("Changing os_status from %s to FAIL", os_status)
+        os_status = FAIL
+
+    return os_status
+
+def run_test(test, options, env, executor=None):
+    t_path = os.path.join(TEST_SUITE, test['group'])
+    env = env.copy()
+    env['CIM_TC'] = test['test']
+    env['CIM_STATS_FILE'] = STATS_FILE % (os.getpid(),
+                                          env.get('CIM_WORKER_ID', '0'))
+
+    args = ['-i', options.ip, '-v', options.virt, '-m', options.t_url]
+    if options.debug:
+        args.append('-d')
+
+    start_time = time()
+    if executor is not None:
+        os_status, output = executor.run(t_path, test['test'], args, env)
+        end_time = time()
+        return check_status(os_status), output, end_time - start_time, \
+               Stats.read(env['CIM_STATS_FILE'])
+
+    cmd = 'python %s %s' % (test['test'], ' '.join(args))
+    proc = Popen(cmd, shell=True, cwd=t_path, env=env, stdout=PIPE,
+                 stderr=STDOUT)
+    output = proc.communicate()[0]
+    end_time = time()
+
+    if output[-1:] == '\n':
+        output = output[:-1]
+
+    return check_status(proc.returncode), output, end_time - start_time, \
+           Stats.read(env['CIM_STATS_FILE'])
+
+class TestScheduler:
+    """Hand out tests to workers, never running two tests that hardcode
+       the same guest, pool or network name at the same time.
+    """
+
+    def __init__(self, test_list):
+        self.pending = list(test_list)
+        self.busy = set()
+        self.cond = threading.Condition()
+
+        for test in self.pending:
+            test['resources'] = groups.get_test_resources(TEST_SUITE, test)
+
+    def __conflicts(self, resources):
+        if resources & self.busy:
+            return True
+
+        if not self.busy:
+            return False
+
+        return groups.EXCLUSIVE in resources or groups.EXCLUSIVE in self.busy
+
+    def next_test(self):
+        self.cond.acquire()
+        try:
+            while self.pending:
+                for i, test in enumerate(self.pending):
+                    if not self.__conflicts(test['resources']):
+                        self.busy |= test['resources']
+                        return self.pending.pop(i)
+                self.cond.wait()
+            return None
+        finally:
+            self.cond.release()
+
+    def test_done(self, test):
+        self.cond.acquire()
+        self.busy -= test['resources']
+        self.cond.notifyAll()
+        self.cond.release()
+
+def wait_until_ready(options, env):
+    """Wait until the CIMOM answers and none of the guests recorded by
+       the last test are left, for at most options.pause seconds.
+    """
+    hs_class = get_typed_class(options.virt, 'HostSystem')
+    fuuid = env.get('CIM_FUUID', CIM_FUUID)
+
+    def ready():
+        try:
+            get_conn(options.ip).EnumerateInstanceNames(hs_class)
+        except Exception:
+            return False
+
+        uuid_list = read_uuid_list(fuuid)
+        if len(uuid_list) == 0:
+            return True
+
+        for uuid in domain_uuids(options.ip, options.virt).values():
+            if uuid in uuid_list:
+                return False
+
+        return True
+
+    wait_for(ready, options.pause, desc="the next test to be able to run")
+
+def run_worker(worker_id, scheduler, options, testsuite, lock, totals):
+    env = get_worker_env(worker_id)
+
+    executor = None
+    if options.in_process:
+        executor = TestExecutor(env)
+
+    try:
+        run_worker_tests(scheduler, options, testsuite, lock, totals, env,
+                         executor)
+    finally:
+        if executor is not None:
+            executor.stop()
+
+def run_worker_tests(scheduler, options, testsuite, lock, totals, env,
+                     executor):
+    div = "--------------------------------------------------------------------"
+
+    while True:
+        test = scheduler.next_test()
+        if test is None:
+            break
+
+        try:
+            os_status, output, exec_time, stats = run_test(test, options,
+                                                           env, executor)
+        finally:
+            scheduler.test_done(test)
+
+        lock.acquire()
+        testsuite.debug(div)
+        testsuite.print_results(test['group'], test['test'], os_status,
+                                output, exec_time, stats)
+        totals.append(exec_time)
+        if options.print_exec_time:
+            print_exec_time(testsuite, exec_time, "  Test execution time:")
+        lock.release()
+
+        # Give the cimserver a chance to catch up before running the
+        # next test, in case it is a little slow to respond
+        wait_until_ready(options, env)
+
+def run_tests(test_list, options, testsuite):
+    scheduler = TestScheduler(test_list)
+    lock = threading.Lock()
+    totals = []
+
+    if options.jobs == 1:
+        run_worker(0, scheduler, options, testsuite, lock, totals)
+        return sum(totals)
+
+    workers = []
+    for worker_id in range(1, options.jobs + 1):
+        t = threading.Thread(target=run_worker,
+                             args=(worker_id, scheduler, options, testsuite,
+                                   lock, totals))
+        t.setDaemon(True)
+        t.start()
+        workers.append(t)
+
+    # Join with a timeout so that KeyboardInterrupt is still delivered
+    for t in workers:
+        while t.isAlive():
+            t.join(1)
+
+    merge_group_logs(test_list, options.jobs)
+
+    return sum(totals)
+
+def parse_shard(shard):
+    try:
+        i, k = [int(x) for x in shard.split('/')]
+    except ValueError:
+        return None
+
+    if k < 1 or i < 1 or i > k:
+        return None
+
+    return i, k
+
+def read_durations(results_file):
+    """Return the time of each test in a result file as a dict of
+       (group, test) : seconds, or None if the file can't be read.
+    """
+    records = TestSuite.read_results(results_file)
+    if records is None:
+        return None
+
+    return dict([((rec['group'], rec['test']), rec['time'])
+                 for rec in records if rec.get('time') is not None])
+
+def shard_test_list(test_list, options, testsuite):
+    durations = {}
+    if options.history:
+        durations = history.test_durations(options.history, options.virt,
+                                           options.history_window)
+
+    if options.shard:
+        # The hosts running the other shards must come up with the same
+        # split, so only the durations they are all given are used, never
+        # the local history
+        shard_durations = {}
+        if options.shard_durations:
+            shard_durations = read_durations(options.shard_durations)
+
+        shard, shards = parse_shard(options.shard)
+        test_list = groups.shard_tests(test_list, shard, shards,
+                                       shard_durations)
+        expected = sum(groups.expected_time(test_list, shard_durations))
+        testsuite.debug("Shard %d/%d: %d tests, about %d seconds expected\n" %
+                        (shard, shards, len(test_list), expected))
+
+    if options.jobs > 1 and durations:
+        test_list = groups.sort_by_duration(test_list, durations)
+
+    return test_list
+
+def merge_results(options):
+    from_addr = None
+    relay = None
+    if options.report:
+        from_addr, relay = get_rcfile_vals()
+        if from_addr == None or relay == None:
+            return 1
+
+    expected = [(test['group'], test['test'])
+                for test in get_test_list(options) or []]
+    testsuite = TestSuite.merge_results(options.merge_results.split(','),
+                                        expected=expected)
+    if testsuite is None:
+        print "Unable to read the results in %s" % options.merge_results
+        return 1
+
+    msg_body, heading = gen_report(options.virt, options.ip, testsuite.log_file,
+                                   testsuite.results_file)
+
+    if options.report:
+        print "Sending mail from %s to %s using %s relay.\n" % \
+              (from_addr, options.report, relay)
+        send_report(options.report, from_addr, relay, msg_body, heading)
+
+    if testsuite.duplicated or testsuite.missing:
+        return 1
+
+    return 0
+
+def get_test_list(options):
+    if options.group:
+        if options.test:
+            return groups.get_one_test(TEST_SUITE, options.group,
+                                       options.test)
+        return groups.get_group_test_list(TEST_SUITE, options.group)
+
+    if options.test_subset:
+        return groups.get_subset_test_list(TEST_SUITE, options.test_subset)
+
+    return groups.list_all_tests(TEST_SUITE)
+
 def main(options, args):
     to_addr = None
     from_addr = None
     relay = None
     div = "--------------------------------------------------------------------"
 
+    if options.merge_results:
+        return merge_results(options)
+
     if options.test and not options.group:
         parser.print_help()
         return 1
@@ -193,6 +666,22 @@ def main(options, args):
         parser.print_help()
         return 1
 
+    if options.jobs < 1:
+        print "\nThe number of jobs must be at least 1.\n"
+        parser.print_help()
+        return 1
+
+    if options.shard and parse_shard(options.shard) is None:
+        print "\nThe shard must be given as i/K, with 1 <= i <= K.\n"
+        parser.print_help()
+        return 1
+
+    if options.shard_durations and read_durations(options.shard_durations) \
+       is None:
+        print "\nUnable to read the shard durations in %s.\n" % \
+              options.shard_durations
+        return 1
+
     env_ready = pre_check(options.ip, options.virt)
     if env_ready != None: 
         print "\n%s.  Please check your environment.\n" % env_ready
@@ -202,6 +691,12 @@ def main(options, args):
     # with a different port 
     if options.port:
         os.environ['CIMOM_PORT'] = str(options.port)
+
+    if options.read_cache:
+        os.environ['CIM_READ_CACHE'] = '1'
+
+    if options.enum_jobs > 1:
+        os.environ['CIM_ENUM_JOBS'] = str(options.enum_jobs)
    
     # src and target host info to be able to use
     # in the tc for comparison in remote migration case
@@ -222,35 +717,19 @@ def main(options, args):
    
     set_python_path()
 
-    if options.group:
-        if options.test:
-            test_list = groups.get_one_test(TEST_SUITE, options.group, 
-                                            options.test)
-        else:
-            test_list = groups.get_group_test_list(TEST_SUITE, options.group)
-
-        if not test_list:
-            print "Test %s:%s not found" % (options.group, options.test)
-            return 1
-
-    elif options.test_subset:
-        test_list = groups.get_subset_test_list(TEST_SUITE, options.test_subset)
-
-        if not test_list:
-            print "Test subset not found: %s" % (options.test_subset)
-            return 1
+    test_list = get_test_list(options)
+    if not test_list and options.group:
+        print "Test %s:%s not found" % (options.group, options.test)
+        return 1
+    elif not test_list and options.test_subset:
+        print "Test subset not found: %s" % (options.test_subset)
+        return 1
 
-    else:
-        test_list = groups.list_all_tests(TEST_SUITE)
+    test_list = shard_test_list(test_list, options, testsuite)
 
     if options.clean:
         remove_old_logs(options.group)
 
-    if options.debug:
-        dbg = "-d"
-    else:
-        dbg = ""
-
     status = setup_env(options.ip, options.virt)
     if status != PASS:
         print "Please check your environment.\n"
@@ -259,43 +738,11 @@ def main(options, args):
 
     print "\nTesting " + options.virt + " hypervisor"
 
-    test_run_time_total = 0
-
-    for test in test_list: 
-        testsuite.debug(div) 
-        t_path = os.path.join(TEST_SUITE, test['group'])
-        os.environ['CIM_TC'] = test['test'] 
-        cdto = 'cd %s' % t_path
-        run = 'python %s -i %s -v %s %s -m %s' % (test['test'], options.ip, 
-                                                  options.virt, dbg,
-                                                  options.t_url)
-        cmd = cdto + ' && ' + ' ' + run
-        start_time = time()
-        status, output = commands.getstatusoutput(cmd)
-        end_time = time()
-
-        os_status = os.WEXITSTATUS(status)
-
-        # status should be from our test; however, if there's an OS level
-        # failure, it could be set to errno.  But that's included in our
-        # output, so just set it to FAIL; otherwise, we get a KeyError
-        # in Reporter.py when trying to index it's 'rc' record
-        if os_status not in (PASS, FAIL, XFAIL, SKIP):
-               logger.error("Changing os_status from %d to FAIL", os_status)
-               os_status = FAIL
-
-        testsuite.print_results(test['group'], test['test'], os_status, output)
-
-        exec_time = end_time - start_time
-        test_run_time_total = test_run_time_total + exec_time
-
-        if options.print_exec_time:
-            print_exec_time(testsuite, exec_time, "  Test execution time:")
-
-        # Give ourselves a 3 second pause before running the next
-        # test to help ensure we have cleaned things up properly just
-        # in case the cimserver is a little slow to respond
-        sleep(3)
+    prime_host_facts(options.ip, options.virt)
+    try:
+        test_run_time_total = run_tests(test_list, options, testsuite)
+    finally:
+        remove_host_facts()
 
     testsuite.debug("%s\n" % div) 
 
@@ -303,13 +750,35 @@ def main(options, args):
         print_exec_time(testsuite, test_run_time_total, "Total test execution:")
         testsuite.debug("\n") 
 
+    if options.profile_cim:
+        print_cim_profile(testsuite)
+        testsuite.debug("\n")
+
+    if options.profile_remote:
+        print_remote_profile(testsuite)
+        testsuite.debug("\n")
+
+    if options.history:
+        run_id = history.record_run(options.history, options.virt,
+                                    options.ip,
+                                    [rec for rec, output in testsuite.records])
+        if run_id is not None:
+            for line in history.regression_report(options.history, run_id,
+                                                  options.regress_threshold,
+                                                  options.history_window):
+                testsuite.debug(line)
+            testsuite.debug("\n")
+
     testsuite.finish()
 
     status = cleanup_env(options.ip, options.virt)
     if status != PASS:
         print "Unable to clean up.  Please check your environment.\n"
 
-    msg_body, heading = gen_report(options.virt, options.ip, testsuite.log_file)
+    utils.close_sessions([options.ip, options.t_url])
+
+    msg_body, heading = gen_report(options.virt, options.ip, testsuite.log_file,
+                                   testsuite.results_file)
 
     if options.report:
         print "Sending mail from %s to %s using %s relay.\n" % \
@@ -331,6 +800,7 @@ if __name__ == '__main__':
             print "Unable to clean up. Please check your environment."
         else:
             print "Clean up successful"
+        utils.close_sessions([options.ip, options.t_url])
 
     sys.exit(ret)
 